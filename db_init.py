@@ -3,7 +3,9 @@ import os
 from passlib.hash import bcrypt
 
 branch = os.getenv("WIRETIDE_BRANCH", "main")
-if branch == "beta":
+if os.getenv("WIRETIDE_DB_PATH"):
+    DB_PATH = os.getenv("WIRETIDE_DB_PATH")
+elif branch == "beta":
     DB_PATH = "/opt/wiretide-beta/wiretide.db"
 else:
     DB_PATH = "/opt/wiretide/wiretide.db"
@@ -57,6 +59,29 @@ CREATE TABLE IF NOT EXISTS device_status (
 ensure_column(cursor, "device_status", "firewall_profile_active", "TEXT")
 ensure_column(cursor, "device_status", "security_log_samples", "TEXT")
 ensure_column(cursor, "device_status", "clients", "TEXT")
+# online/stale/offline, maintained by the liveness scheduler
+ensure_column(cursor, "devices", "liveness", "TEXT DEFAULT 'unknown'")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_liveness ON devices (liveness)")
+# /api/devices sort orders and filters (keyset paging on <key>, mac)
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices (last_seen, mac)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_hostname ON devices (hostname, mac)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_status ON devices (status, last_seen, mac)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_type ON devices (device_type, last_seen, mac)")
+# last_seen is UTC ISO ("...T...+00:00") like status reports, so it sorts as a string.
+# Registration used to write naive local time (with microseconds) and the
+# column default is UTC without 'T'; convert those once.
+cursor.execute("""
+UPDATE devices
+SET last_seen = strftime('%Y-%m-%dT%H:%M:%f', last_seen,
+                         CASE WHEN last_seen LIKE '%.%' THEN 'utc' ELSE '+0 seconds' END) || '+00:00'
+WHERE substr(last_seen, 11, 1) = ' ' AND strftime('%s', last_seen) IS NOT NULL
+""")
+cursor.execute("""
+UPDATE devices
+SET last_seen = (SELECT ds.updated_at FROM device_status ds WHERE ds.mac = devices.mac)
+WHERE EXISTS (SELECT 1 FROM device_status ds
+              WHERE ds.mac = devices.mac AND ds.updated_at > COALESCE(devices.last_seen, ''))
+""")
 
 
 # --- Device configs table ---
@@ -79,6 +104,95 @@ CREATE TABLE IF NOT EXISTS client_controls (
 """)
 
 
+# --- Client inventory (one row per client per router, maintained by ingest) ---
+# WITHOUT ROWID: rows live in the primary-key b-tree, no separate rowid table
+CLIENTS_DDL = """
+CREATE TABLE IF NOT EXISTS {name} (
+    router_mac TEXT NOT NULL,
+    client_mac TEXT NOT NULL,
+    ip TEXT,
+    hostname TEXT,
+    last_seen TIMESTAMP,
+    PRIMARY KEY (router_mac, client_mac)
+) WITHOUT ROWID;
+"""
+cursor.execute(CLIENTS_DDL.format(name="clients"))
+cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='clients'")
+if "WITHOUT ROWID" not in cursor.fetchone()[0].upper():
+    cursor.execute("DROP TABLE IF EXISTS clients_new")
+    cursor.execute(CLIENTS_DDL.format(name="clients_new"))
+    cursor.execute("INSERT OR IGNORE INTO clients_new SELECT router_mac, client_mac, ip, hostname, last_seen FROM clients")
+    cursor.execute("DROP TABLE clients")
+    cursor.execute("ALTER TABLE clients_new RENAME TO clients")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_client_mac ON clients (client_mac)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_ip ON clients (ip)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_clients_hostname ON clients (hostname)")
+
+# Backfill from the old per-router JSON blobs (device_status.clients)
+cursor.execute("SELECT COUNT(*) FROM clients")
+if cursor.fetchone()[0] == 0:
+    import json
+    cursor.execute("SELECT mac, clients, updated_at FROM device_status WHERE clients IS NOT NULL")
+    for router_mac, blob, updated_at in cursor.fetchall():
+        try:
+            entries = json.loads(blob)
+        except Exception:
+            continue
+        for c in entries if isinstance(entries, list) else []:
+            if isinstance(c, dict) and c.get("mac"):
+                cursor.execute(
+                    "INSERT OR IGNORE INTO clients (router_mac, client_mac, ip, hostname, last_seen) VALUES (?, ?, ?, ?, ?)",
+                    (router_mac.lower(), str(c["mac"]).lower(), c.get("ip"), c.get("hostname"), updated_at)
+                )
+
+
+# --- Status history (minute/hour/day buckets, maintained by ingest) ---
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS status_history (
+    mac TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    client_sum INTEGER NOT NULL,
+    client_max INTEGER NOT NULL,
+    ntp_ok INTEGER NOT NULL,
+    wan_ip TEXT,
+    firewall_profile TEXT,
+    wan_ip_changes INTEGER NOT NULL DEFAULT 0,
+    profile_changes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (mac, resolution, bucket)
+) WITHOUT ROWID;
+""")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_status_history_prune ON status_history (resolution, bucket)")
+
+# --- Security events (WTSEC log lines from agents, full-text indexed) ---
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS security_events (
+    id INTEGER PRIMARY KEY,
+    mac TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    line_hash INTEGER NOT NULL,
+    line TEXT NOT NULL
+);
+""")
+cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_security_events_dedupe ON security_events (mac, line_hash)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_security_events_mac ON security_events (mac)")
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_security_events_ts ON security_events (ts)")
+cursor.execute("""
+CREATE VIRTUAL TABLE IF NOT EXISTS security_events_fts USING fts5(
+    line, content='security_events', content_rowid='id'
+);
+""")
+cursor.executescript("""
+CREATE TRIGGER IF NOT EXISTS security_events_ai AFTER INSERT ON security_events BEGIN
+    INSERT INTO security_events_fts (rowid, line) VALUES (new.id, new.line);
+END;
+CREATE TRIGGER IF NOT EXISTS security_events_ad AFTER DELETE ON security_events BEGIN
+    INSERT INTO security_events_fts (security_events_fts, rowid, line) VALUES ('delete', old.id, old.line);
+END;
+""")
+
+
 # --- Tokens table ---
 cursor.execute("""
 CREATE TABLE IF NOT EXISTS tokens (
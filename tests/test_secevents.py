@@ -0,0 +1,56 @@
+# tests/test_secevents.py
+import asyncio
+import os
+import subprocess
+import sys
+
+from wiretide.db import ConnectionPool
+from wiretide.secevents import SecurityEventStore
+from wiretide.secstats import SecurityStats
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _line(i: int) -> str:
+    return f"Fri Oct 17 03:00:{i:02d} 2026 kern.warn kernel: WTSEC IN=br-lan OUT=eth0 SRC=10.0.0.{i} DST=1.1.1.1"
+
+
+def _init_db(path: str):
+    subprocess.run([sys.executable, "db_init.py"], cwd=ROOT, check=True, capture_output=True,
+                   env={**os.environ, "WIRETIDE_DB_PATH": path})
+
+
+def test_resent_tail_is_not_counted_again_after_reset(tmp_path):
+    path = str(tmp_path / "wiretide.db")
+    _init_db(path)
+
+    async def run():
+        pool = ConnectionPool(path, readers=1)
+        store, stats = SecurityEventStore(), SecurityStats()
+        report = {"mac": "aa:bb:cc:00:00:01", "security_log_lines": [_line(i) for i in range(30)]}
+
+        async def ingest(reports):
+            async with pool.writer() as db:
+                new = await store.record(db, reports)
+                await db.commit()
+            stats.observe(new)
+            return new
+
+        assert len(await ingest([report])) == 30
+        # Same tail again, then again with the in-memory dedupe state lost
+        assert await ingest([report]) == []
+        store.reset()
+        assert await ingest([report]) == []
+        # The next report slides the tail by five lines
+        report["security_log_lines"] = [_line(i) for i in range(5, 35)]
+        store.reset()
+        assert len(await ingest([report, report])) == 5
+
+        async with pool.reader() as db:
+            rows = (await (await db.execute("SELECT COUNT(*) FROM security_events")).fetchone())[0]
+        await pool.close()
+        return rows, stats.counters["lines"]
+
+    rows, counted = asyncio.run(run())
+    assert rows == 35
+    assert counted == 35
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# tools/bench_status_parse.py
+"""CPU cost per status report: old ad-hoc parsing vs the StatusPayload decoder.
+
+    python tools/bench_status_parse.py --iterations 20000 --clients 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wiretide.inventory import normalize_clients  # noqa: E402
+from wiretide.models import StatusPayload  # noqa: E402
+
+
+def sample_body(clients: int, samples: int) -> bytes:
+    return json.dumps({
+        "mac": "02:57:54:00:00:01",
+        "hostname": "bench",
+        "device_type": "router",
+        "ssh_enabled": True,
+        "settings": {
+            "model": "Bench Router",
+            "wan_ip": "198.51.100.7",
+            "dns": ["1.1.1.1", "9.9.9.9"],
+            "ntp": True,
+            "firewall": True,
+            "firewall_profile": "default",
+            "security_log_samples": [
+                f"Fri Oct 17 12:00:{i % 60:02d} 2026 kern.warn kernel: WTSEC IN=eth1 OUT= "
+                f"SRC=203.0.113.{i % 254 + 1} DST=198.51.100.7 PROTO=TCP SPT={40000 + i} DPT=22"
+                for i in range(samples)
+            ],
+            "agent_version": "bench",
+        },
+        "clients": [
+            {"ip": f"192.168.1.{i % 250 + 2}", "mac": f"0A:00:00:00:{i // 256:02X}:{i % 256:02X}",
+             "hostname": f"host-{i}"}
+            for i in range(clients)
+        ],
+    }).encode()
+
+
+def legacy_parse(raw_body: bytes) -> dict:
+    """The pre-decoder path: debug re-dump, pick() lookups, clients re-encoded (file writes left out)."""
+    payload = json.loads(raw_body)
+    json.dumps(payload, indent=2)  # /tmp/wt-debug-payload.json
+    mac = (payload.get("mac") or "").lower()
+    s = payload.get("settings") or {}
+    clients_raw = payload.get("clients", [])
+
+    def pick(*keys, default=None):
+        for k in keys:
+            if k in s and s[k] not in (None, ""):
+                return s[k]
+            if k in payload and payload[k] not in (None, ""):
+                return payload[k]
+        return default
+
+    model = pick("model", default="unknown")
+    wan_ip = pick("wan_ip")
+    dns = pick("dns", "dns_servers", default=[])
+    ntp = pick("ntp", "ntp_synced", default=False)
+    fw_state = pick("firewall", "firewall_state", default=True)
+    fw_profile = pick("firewall_profile", "firewall_profile_active")
+    sec_raw = pick("security_log_samples", default=[])
+    ssh_enabled = bool(payload.get("ssh_enabled"))
+    if isinstance(dns, str):
+        try:
+            maybe = json.loads(dns)
+            dns_list = maybe if isinstance(maybe, list) else [dns]
+        except Exception:
+            dns_list = [x.strip() for x in dns.split(",") if x.strip()]
+    elif isinstance(dns, list):
+        dns_list = [str(x) for x in dns]
+    else:
+        dns_list = []
+    if isinstance(sec_raw, list):
+        sec_list = [str(x) for x in sec_raw][-50:]
+    elif isinstance(sec_raw, str):
+        sec_list = [ln for ln in sec_raw.splitlines() if ln.strip()][-50:]
+    else:
+        sec_list = []
+    clients_json = json.dumps(clients_raw[:100] if isinstance(clients_raw, list) else [])
+    clients = normalize_clients(json.loads(clients_json))
+    return {
+        "mac": mac,
+        "model": str(model),
+        "wan_ip": str(wan_ip) if wan_ip else None,
+        "dns_servers": json.dumps(dns_list),
+        "ntp_synced": int(ntp),
+        "firewall_state": str(fw_state),
+        "firewall_profile_active": str(fw_profile) if fw_profile else None,
+        "security_log_samples": json.dumps(sec_list),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "clients": clients,
+        "ssh_enabled": int(ssh_enabled),
+    }
+
+
+def decoder_parse(raw_body: bytes) -> dict:
+    return StatusPayload.model_validate_json(raw_body).to_report()
+
+
+def bench(fn, body: bytes, iterations: int) -> float:
+    for _ in range(min(200, iterations)):
+        fn(body)
+    start = time.process_time()
+    for _ in range(iterations):
+        fn(body)
+    return (time.process_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    body = sample_body(args.clients, args.samples)
+    old, new = legacy_parse(body), decoder_parse(body)
+    for key in old:
+        if key != "updated_at" and old[key] != new[key]:
+            raise SystemExit(f"decoders disagree on {key!r}: {old[key]!r} != {new[key]!r}")
+
+    print(f"payload {len(body)} bytes, {args.clients} clients, {args.samples} log lines")
+    legacy = bench(legacy_parse, body, args.iterations)
+    decoder = bench(decoder_parse, body, args.iterations)
+    print(f"legacy   {legacy * 1e6:8.1f} us CPU/report")
+    print(f"decoder  {decoder * 1e6:8.1f} us CPU/report  ({legacy / decoder:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
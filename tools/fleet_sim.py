@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# tools/fleet_sim.py
+"""Synthetic agent fleet: load-test a Wiretide controller with N fake routers.
+
+Each simulated agent follows the wiretide-agent-run protocol: POST /register,
+GET /token/{mac} (retrying until approved), then every INTERVAL seconds
+(+/- jitter) POST /status and GET /config with If-None-Match - or POST /sync
+with --protocol sync. Like the real agent, reports are merge patches against
+the last acknowledged payload (X-Status-Base) unless --no-delta is given.
+With --long-poll agents wait on GET /config/wait between cycles instead of
+sleeping. --large-routers gives a share of the routers --large-clients
+clients; tables over the agent's inline limit go through /clients/chunk
+(skipped while unchanged, as the agent does).
+
+Routers behave like real ones between cycles: the WAN address and DNS stay
+put (with a small --wan-change chance per cycle), clients churn slowly and
+the security log is a sliding tail that gains a few lines at a time. Many
+reports are therefore identical or nearly so, as on a real fleet.
+
+By default a throwaway controller is started with uvicorn on a temp
+WIRETIDE_DB_PATH and the simulated devices are approved directly in its DB.
+Use --url to target an already running controller instead (devices must then
+be approved by hand or the agents stay in the token phase).
+
+    python tools/fleet_sim.py --agents 500 --duration 120 --interval 30
+
+Needs httpx, a development-only dependency (pip install httpx); the
+controller itself does not use it.
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+
+try:
+    import httpx
+except ImportError:
+    raise SystemExit("tools/fleet_sim.py needs httpx: pip install httpx")
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HOSTNAMES = ["laptop", "phone", "tv", "printer", "nas", "tablet", "camera", "thermostat",
+             "console", "desktop", "speaker", "watch"]
+DNS = ["1.1.1.1", "8.8.8.8", "9.9.9.9"]
+# The agent sends the last 20 WTSEC lines of logread with every report
+SECURITY_TAIL = 20
+# wiretide-agent-run defaults: CLIENT_INLINE_MAX, CLIENT_CHUNK_SIZE, CLIENT_RESEND
+CLIENT_INLINE_MAX = 200
+CLIENT_CHUNK_SIZE = 500
+CLIENT_RESEND = 600
+# Registration and token fetch; their rates are over the setup phase
+SETUP_ENDPOINTS = ("/register", "/token/{mac}")
+
+
+class Stats:
+    """Latency samples and status codes per endpoint."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.codes = defaultdict(Counter)
+        self.lock_errors = 0
+        self.failures = Counter()
+        # Seconds spent in the setup phase (register, tokens) and under steady load
+        self.setup_seconds = 0.0
+        self.steady_seconds = 0.0
+
+    def record(self, endpoint: str, seconds: float, response: httpx.Response):
+        self.latencies[endpoint].append(seconds)
+        self.codes[endpoint][response.status_code] += 1
+        if response.status_code >= 500 and "locked" in response.text.lower():
+            self.lock_errors += 1
+
+    def fail(self, endpoint: str, exc: Exception):
+        self.failures[f"{endpoint}: {type(exc).__name__}"] += 1
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Agent:
+    """One fake router with a stable client population."""
+
+    def __init__(self, index: int, args):
+        self.args = args
+        self.mac = "02:57:54:%02x:%02x:%02x" % ((index >> 16) & 255, (index >> 8) & 255, index & 255)
+        self.hostname = f"sim-{index:05d}"
+        self.token = None
+        self.revision = None
+        # Last acknowledged payload and its status revision (delta reports)
+        self.status_base = None
+        self.status_revision = None
+        self.rng = random.Random(index)
+        if self.rng.random() < args.large_routers:
+            count = self.rng.randint(args.large_clients // 2, args.large_clients * 3 // 2)
+        else:
+            count = self.rng.randint(0, args.clients * 2)
+        self.clients = [self._new_client() for _ in range(count)]
+        # Digest and time of the last client table sent through /clients/chunk
+        self.clients_sent = None
+        self.clients_sent_at = 0.0
+        self.wan_ip = self._new_wan_ip()
+        self.dns = self.rng.sample(DNS, 2)
+        self.security_log = deque(maxlen=SECURITY_TAIL)
+
+    def _new_client(self) -> dict:
+        octets = [self.rng.randint(0, 255) for _ in range(3)]
+        return {
+            "ip": f"192.168.1.{self.rng.randint(2, 254)}",
+            "mac": "0a:%02x:%02x:%02x:%02x:%02x" % (*octets, self.rng.randint(0, 255), self.rng.randint(0, 255)),
+            "hostname": f"{self.rng.choice(HOSTNAMES)}-{self.rng.randint(1, 99)}",
+        }
+
+    def _churn(self):
+        for i in range(len(self.clients)):
+            if self.rng.random() < self.args.churn:
+                self.clients[i] = self._new_client()
+
+    def _new_wan_ip(self) -> str:
+        return f"198.51.100.{self.rng.randint(1, 254)}"
+
+    def _security_samples(self) -> list[str]:
+        """Append this cycle's new WTSEC lines and return the tail the agent would send."""
+        for _ in range(self.rng.randint(0, self.args.security_lines * 2)):
+            self.security_log.append(
+                "%s kern.warn kernel: [%d.%03d] WTSEC IN=eth1 OUT= MAC= SRC=%d.%d.%d.%d DST=203.0.113.%d "
+                "LEN=60 PROTO=TCP SPT=%d DPT=%d" % (
+                    time.strftime("%a %b %d %H:%M:%S %Y"),
+                    self.rng.randint(1000, 99999), self.rng.randint(0, 999),
+                    *(self.rng.randint(1, 254) for _ in range(4)), self.rng.randint(1, 254),
+                    self.rng.randint(1024, 65535), self.rng.choice([22, 23, 80, 443, 3389, 8080]),
+                )
+            )
+        return list(self.security_log)
+
+    @property
+    def chunked(self) -> bool:
+        return len(self.clients) > CLIENT_INLINE_MAX
+
+    def payload(self) -> dict:
+        self._churn()
+        if self.rng.random() < self.args.wan_change:
+            self.wan_ip = self._new_wan_ip()
+        return {
+            "mac": self.mac,
+            "hostname": self.hostname,
+            "device_type": "router",
+            "ssh_enabled": True,
+            "settings": {
+                "model": "Simulated Router",
+                "wan_ip": self.wan_ip,
+                "dns": self.dns,
+                "ntp": True,
+                "firewall": True,
+                "firewall_profile": "default",
+                "security_log_samples": self._security_samples(),
+                "agent_version": "sim",
+            },
+            "clients": [] if self.chunked else [dict(c) for c in self.clients],
+            "clients_chunked": self.chunked,
+        }
+
+
+def merge_diff(old, new):
+    """RFC 7396 merge patch turning `old` into `new` (arrays are replaced whole)."""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    patch = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        if key not in old or old[key] != value:
+            patch[key] = merge_diff(old.get(key), value)
+    return patch
+
+
+async def timed(stats: Stats, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kw):
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kw)
+    except httpx.HTTPError as e:
+        stats.fail(endpoint, e)
+        return None
+    stats.record(endpoint, time.perf_counter() - start, response)
+    return response
+
+
+async def register(agent: Agent, client: httpx.AsyncClient, stats: Stats):
+    await timed(stats, client, "/register", "POST", "/register", json={
+        "hostname": agent.hostname, "mac": agent.mac,
+        "ssh_fingerprint": "SHA256:sim", "ssh_enabled": True,
+    })
+
+
+async def fetch_token(agent: Agent, client: httpx.AsyncClient, stats: Stats, deadline: float):
+    delay = 1.0
+    while time.monotonic() < deadline:
+        r = await timed(stats, client, "/token/{mac}", "GET", f"/token/{agent.mac}")
+        if r is not None and r.status_code == 200:
+            agent.token = r.json().get("token")
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30)
+
+
+async def post_status(agent: Agent, client: httpx.AsyncClient, stats: Stats, path: str, headers: dict):
+    """POST a report the way wiretide-agent-run does: a patch when possible, full on 409."""
+    payload = agent.payload()
+    r = None
+    if agent.args.delta and agent.status_revision:
+        r = await timed(stats, client, f"{path} (delta)", "POST", path,
+                        json=merge_diff(agent.status_base, payload),
+                        headers={**headers, "X-Status-Base": agent.status_revision})
+    if r is None or r.status_code == 409:
+        r = await timed(stats, client, path, "POST", path, json=payload, headers=headers)
+    agent.status_revision = None
+    if r is not None and r.status_code == 200 and agent.args.delta:
+        agent.status_revision = r.json().get("status_revision")
+        agent.status_base = payload
+    return r
+
+
+async def upload_clients(agent: Agent, client: httpx.AsyncClient, stats: Stats):
+    """Send a large client table in /clients/chunk pieces, unless it is unchanged."""
+    digest = hash(tuple((c["mac"], c["ip"], c["hostname"]) for c in agent.clients))
+    now = time.monotonic()
+    if digest == agent.clients_sent and now - agent.clients_sent_at < CLIENT_RESEND:
+        return
+    agent.clients_sent = None
+    headers = {"X-API-Token": agent.token, "X-MAC": agent.mac}
+    upload = f"{int(time.time())}.{agent.mac}"
+    total = len(agent.clients)
+    for seq, start in enumerate(range(0, total, CLIENT_CHUNK_SIZE)):
+        part = agent.clients[start:start + CLIENT_CHUNK_SIZE]
+        r = await timed(stats, client, "/clients/chunk", "POST", "/clients/chunk", headers=headers, json={
+            "upload": upload, "seq": seq, "last": start + CLIENT_CHUNK_SIZE >= total,
+            "mac": [c["mac"] for c in part],
+            "ip": [c["ip"] for c in part],
+            "hostname": [c["hostname"] for c in part],
+        })
+        if r is None or r.status_code != 200:
+            return
+    agent.clients_sent, agent.clients_sent_at = digest, now
+
+
+async def cycle(agent: Agent, client: httpx.AsyncClient, stats: Stats):
+    headers = {"X-API-Token": agent.token, "X-MAC": agent.mac}
+    if agent.args.protocol == "sync":
+        if agent.revision:
+            headers["X-Config-Revision"] = agent.revision
+        r = await post_status(agent, client, stats, "/sync", headers)
+        if r is not None and r.status_code == 200:
+            agent.revision = r.json().get("config", {}).get("revision") or agent.revision
+    else:
+        await post_status(agent, client, stats, "/status", headers)
+        if agent.revision:
+            headers["If-None-Match"] = f'"{agent.revision}"'
+        r = await timed(stats, client, "/config", "GET", "/config", headers=headers)
+        if r is not None and r.status_code == 200:
+            agent.revision = r.json().get("revision") or agent.revision
+    if agent.chunked:
+        await upload_clients(agent, client, stats)
+
+
+async def wait_for_config(agent: Agent, client: httpx.AsyncClient, stats: Stats, seconds: float):
+    """Spend `seconds` parked on /config/wait, like the agent between cycles."""
+    until = time.monotonic() + seconds
+    while (remaining := until - time.monotonic()) >= 1:
+        headers = {"X-API-Token": agent.token, "X-MAC": agent.mac,
+                   "If-None-Match": f'"{agent.revision or ""}"'}
+        r = await timed(stats, client, "/config/wait", "GET", "/config/wait",
+                        params={"timeout": int(remaining)}, headers=headers,
+                        timeout=remaining + agent.args.timeout)
+        if r is None or r.status_code not in (200, 304):
+            break
+        if r.status_code == 200:
+            revision = r.json().get("revision")
+            if not revision or revision == agent.revision:
+                break  # nothing new to apply: don't spin on it
+            agent.revision = revision
+    await asyncio.sleep(max(0.0, until - time.monotonic()))
+
+
+async def run_agent(agent: Agent, client: httpx.AsyncClient, waits: httpx.AsyncClient, stats: Stats,
+                    deadline: float):
+    interval = agent.args.interval
+    jitter = agent.args.jitter
+    # Agents do not start in lockstep on a real fleet either
+    await asyncio.sleep(agent.rng.uniform(0, interval))
+    while time.monotonic() < deadline:
+        await cycle(agent, client, stats)
+        pause = max(0.0, min(interval * (1 + agent.rng.uniform(-jitter, jitter)), deadline - time.monotonic()))
+        if agent.args.long_poll:
+            await wait_for_config(agent, waits, stats, pause)
+        else:
+            await asyncio.sleep(pause)
+
+
+async def gather_limited(coros, limit: int):
+    sem = asyncio.Semaphore(limit)
+
+    async def bounded(coro):
+        async with sem:
+            return await coro
+
+    await asyncio.gather(*(bounded(c) for c in coros))
+
+
+def approve_all(db_path: str, macs: list[str]):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.executemany(
+        "UPDATE devices SET approved = 1, status = 'approved', device_type = 'router' WHERE mac = ?",
+        [(mac,) for mac in macs],
+    )
+    conn.commit()
+    conn.close()
+
+
+def start_controller(args, workdir: str) -> tuple[subprocess.Popen, dict]:
+    env = dict(os.environ)
+    env.update({
+        "WIRETIDE_DB_PATH": os.path.join(workdir, "wiretide.db"),
+        "WIRETIDE_LOG_FILE": os.path.join(workdir, "wiretide.log"),
+        "WIRETIDE_STATIC_DIR": os.path.join(REPO, "wiretide", "static"),
+    })
+    subprocess.run([sys.executable, "db_init.py"], cwd=REPO, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    conn = sqlite3.connect(env["WIRETIDE_DB_PATH"])
+    conn.execute("INSERT OR REPLACE INTO config (key, value) VALUES ('shared_token', ?)", (args.shared_token,))
+    conn.commit()
+    conn.close()
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "wiretide.main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=REPO, env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise SystemExit(f"controller exited with code {proc.returncode}")
+        try:
+            if httpx.get(f"{url}/login", timeout=1).status_code == 200:
+                return proc, env
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("controller did not come up")
+
+
+def count_log_locks(log_file: str) -> int:
+    try:
+        with open(log_file, errors="replace") as f:
+            return sum(1 for line in f if "database is locked" in line)
+    except OSError:
+        return 0
+
+
+def report(stats: Stats, args, server_locks: int | None):
+    print(f"\n{args.agents} agents, setup {stats.setup_seconds:.1f}s, steady load {stats.steady_seconds:.1f}s, "
+          f"interval {args.interval}s +/- {args.jitter:.0%}, protocol {args.protocol}"
+          f"{', long-poll' if args.long_poll else ''}")
+    print(f"{'endpoint':<16} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}  codes")
+    for endpoint, samples in stats.latencies.items():
+        codes = " ".join(f"{code}:{n}" for code, n in sorted(stats.codes[endpoint].items()))
+        elapsed = stats.setup_seconds if endpoint in SETUP_ENDPOINTS else stats.steady_seconds
+        print(f"{endpoint:<16} {len(samples):>9} {len(samples) / max(elapsed, 1e-9):>8.1f} "
+              f"{percentile(samples, 50) * 1000:>8.1f} {percentile(samples, 99) * 1000:>8.1f} "
+              f"{max(samples) * 1000:>8.1f}  {codes}")
+    for failure, n in stats.failures.most_common():
+        print(f"transport error  {failure} x{n}")
+    print(f"lock errors in responses: {stats.lock_errors}")
+    if server_locks is not None:
+        print(f"'database is locked' in server log: {server_locks}")
+
+
+async def simulate(args, url: str, env: dict | None) -> Stats:
+    stats = Stats()
+    agents = [Agent(i, args) for i in range(args.agents)]
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    # Parked long-polls get their own connections, like one agent per router
+    async with httpx.AsyncClient(base_url=url, verify=False, timeout=args.timeout, limits=limits) as client, \
+            httpx.AsyncClient(base_url=url, verify=False, timeout=args.timeout,
+                              limits=httpx.Limits(max_connections=None)) as waits:
+        started = time.monotonic()
+        await gather_limited((register(a, client, stats) for a in agents), args.connections)
+        if env is not None:
+            approve_all(env["WIRETIDE_DB_PATH"], [a.mac for a in agents])
+        await gather_limited((fetch_token(a, client, stats, started + args.duration) for a in agents),
+                             args.connections)
+        ready = [a for a in agents if a.token]
+        if len(ready) < len(agents):
+            print(f"{len(agents) - len(ready)} agents never got a token (not approved?)")
+        steady = time.monotonic()
+        stats.setup_seconds = steady - started
+        await asyncio.gather(*(run_agent(a, client, waits, stats, steady + args.duration) for a in ready))
+        stats.steady_seconds = time.monotonic() - steady
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of steady-state load")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between agent cycles")
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction of interval")
+    parser.add_argument("--clients", type=int, default=15, help="average clients per router")
+    parser.add_argument("--churn", type=float, default=0.05, help="chance a client is replaced per cycle")
+    parser.add_argument("--wan-change", type=float, default=0.01, help="chance the WAN IP changes per cycle")
+    parser.add_argument("--security-lines", type=int, default=1,
+                        help="average new WTSEC log lines per cycle (the agent sends the last 20)")
+    parser.add_argument("--no-delta", dest="delta", action="store_false",
+                        help="always send full reports instead of merge patches")
+    parser.add_argument("--protocol", choices=["legacy", "sync"], default="legacy")
+    parser.add_argument("--long-poll", action="store_true",
+                        help="wait on /config/wait between cycles instead of sleeping")
+    parser.add_argument("--large-routers", type=float, default=0.0,
+                        help="fraction of routers with about --large-clients clients")
+    parser.add_argument("--large-clients", type=int, default=2000,
+                        help=f"clients per large router (over {CLIENT_INLINE_MAX} go through /clients/chunk)")
+    parser.add_argument("--connections", type=int, default=200, help="max concurrent HTTP connections")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--url", help="target a running controller instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--shared-token", default="fleet-sim-token")
+    parser.add_argument("--keep", action="store_true", help="keep the temp DB and log")
+    args = parser.parse_args()
+
+    proc = env = workdir = None
+    url = args.url
+    if not url:
+        workdir = tempfile.mkdtemp(prefix="wiretide-sim-")
+        proc, env = start_controller(args, workdir)
+        url = f"http://127.0.0.1:{args.port}"
+        print(f"controller on {url}, data in {workdir}")
+
+    try:
+        stats = asyncio.run(simulate(args, url, env))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    report(stats, args, count_log_locks(env["WIRETIDE_LOG_FILE"]) if env else None)
+    if workdir and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import aiosqlite
 from fastapi import HTTPException, Request, Form, APIRouter, Depends
 from fastapi.responses import RedirectResponse, HTMLResponse
 from passlib.hash import bcrypt
-from wiretide.db import DB_PATH
+from wiretide.db import pool, get_db
+from wiretide.token_cache import token_cache
+from wiretide.permission_cache import permission_cache
 
 router = APIRouter()
 
@@ -16,20 +18,15 @@ async def require_api_token(request: Request):
     if not token:
         raise HTTPException(status_code=400, detail="Missing API token")
 
-    token = token.strip()
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token'")
-        row = await cursor.fetchone()
-        db_token = (row[0] if row else "").strip()
-        if token != db_token:
-            raise HTTPException(status_code=403, detail="Invalid API token")
+    if not await token_cache.verify(token):
+        raise HTTPException(status_code=403, detail="Invalid API token")
 
 
 async def verify_api_token(request: Request):
     token = request.headers.get("X-API-Token")
     if not token:
         raise HTTPException(status_code=400, detail="Missing API token")
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT token FROM tokens WHERE token = ?", (token,))
         row = await cursor.fetchone()
         if not row:
@@ -44,15 +41,7 @@ def require_login(request: Request):
 
 async def user_permissions(username: str):
     """Fetch all permissions for a given user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            SELECT rp.permission FROM users u
-            JOIN roles r ON u.role_id = r.id
-            JOIN role_permissions rp ON rp.role_id = r.id
-            WHERE u.username = ?
-        """, (username,))
-        rows = await cursor.fetchall()
-    return [row[0] for row in rows]
+    return sorted(await permission_cache.get(username) or [])
 
 
 async def require_permission(request: Request, permission: str):
@@ -61,14 +50,11 @@ async def require_permission(request: Request, permission: str):
     if not username:
         raise HTTPException(status_code=401, detail="Login required")
 
-    # Confirm the user still exists
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT COUNT(*) FROM users WHERE username = ?", (username,))
-        exists = await cursor.fetchone()
-    if not exists or exists[0] == 0:
+    # None means the user no longer exists
+    perms = await permission_cache.get(username)
+    if perms is None:
         raise HTTPException(status_code=401, detail="User no longer exists")
 
-    perms = await user_permissions(username)
     if "*" not in perms and permission not in perms:
         raise HTTPException(status_code=403, detail="Permission denied")
 
@@ -98,7 +84,7 @@ async def login(request: Request, username: str = Form(...), password: str = For
     templates = Jinja2Templates(directory="wiretide/templates")
 
     # Verify credentials against DB
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
         row = await cursor.fetchone()
 
@@ -153,31 +139,33 @@ async def change_password(
             "error": "New passwords do not match."
         }, status_code=400)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    # bcrypt is slow: verify outside the writer so ingest is not held up
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
         row = await cursor.fetchone()
-        if not row or not bcrypt.verify(old_password, row[0]):
-            from fastapi.templating import Jinja2Templates
-            templates = Jinja2Templates(directory="wiretide/templates")
-            return templates.TemplateResponse("change_password.html", {
-                "request": request,
-                "username": username,
-                "error": "Invalid current password."
-            }, status_code=403)
-
-        new_hash = bcrypt.hash(new_password)
+    if not row or not bcrypt.verify(old_password, row[0]):
+        from fastapi.templating import Jinja2Templates
+        templates = Jinja2Templates(directory="wiretide/templates")
+        return templates.TemplateResponse("change_password.html", {
+            "request": request,
+            "username": username,
+            "error": "Invalid current password."
+        }, status_code=403)
+
+    new_hash = bcrypt.hash(new_password)
+    async with pool.writer() as db:
         await db.execute("UPDATE users SET password_hash = ? WHERE username = ?", (new_hash, username))
         await db.commit()
+    permission_cache.bump()
 
     return RedirectResponse("/settings", status_code=303)
 
 
 # --- User Management API ---
 @router.get("/api/users", dependencies=[Depends(require_login)])
-async def list_users():
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT username, role FROM users")
-        rows = await cursor.fetchall()
+async def list_users(db: aiosqlite.Connection = Depends(get_db)):
+    cursor = await db.execute("SELECT username, role FROM users")
+    rows = await cursor.fetchall()
     return [{"username": row[0], "role": row[1]} for row in rows]
 
 
@@ -187,7 +175,7 @@ async def create_user(username: str = Form(...), password: str = Form(...), role
         raise HTTPException(400, detail="Invalid role")
 
     password_hash = bcrypt.hash(password)
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         cursor = await db.execute("SELECT id FROM roles WHERE name=?", (role,))
         row = await cursor.fetchone()
         role_id = row[0] if row else None
@@ -196,6 +184,7 @@ async def create_user(username: str = Form(...), password: str = Form(...), role
             (username, password_hash, role, role_id)
         )
         await db.commit()
+    permission_cache.bump()
     return RedirectResponse("/settings", status_code=303)
 
 
@@ -206,8 +195,9 @@ async def delete_user(username: str = Form(...), request: Request = None):
     if username == request.session.get("user"):
         raise HTTPException(400, detail="You cannot delete your own account.")
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("DELETE FROM users WHERE username = ?", (username,))
         await db.commit()
+    permission_cache.bump()
     return RedirectResponse("/settings", status_code=303)
 
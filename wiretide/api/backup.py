@@ -8,7 +8,7 @@ from fastapi import APIRouter, UploadFile, Depends, HTTPException
 from fastapi.responses import FileResponse, RedirectResponse
 
 from wiretide.api.auth import rbac_required
-from wiretide.db import DB_PATH
+from wiretide.db import DB_PATH, pool
 from wiretide.tokens import ensure_valid_shared_token
 
 
@@ -20,6 +20,13 @@ SERVICE_GROUP = "wiretide"
 
 router = APIRouter()
 
+
+def remove_db_files():
+    """Verwijder de DB plus de WAL-bestanden (pool moet eerst gesloten zijn)."""
+    for path in (DB_FILE, f"{DB_FILE}-wal", f"{DB_FILE}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
 def fix_permissions():
     """Herstel standaard permissies voor DB, directories en certs."""
     try:
@@ -67,6 +74,8 @@ def restart_service():
 async def download_backup():
     """Maak een tar.gz backup met DB en certificaten."""
     try:
+        # WAL-modus: eerst alle wijzigingen naar het DB-bestand schrijven
+        await pool.checkpoint()
         with tempfile.TemporaryDirectory() as tmpdir:
             # Kopieer DB
             if os.path.exists(DB_FILE):
@@ -114,9 +123,12 @@ async def restore_backup(file: UploadFile):
             temp_extract = tempfile.mkdtemp()
             safe_extract(tar, temp_extract)
 
-            # Database herstellen
+            # Database herstellen (pool eerst sluiten, anders schrijft de WAL terug)
             db_src = os.path.join(temp_extract, "wiretide.db")
             if os.path.exists(db_src):
+                await pool.close()
+                # Een achtergebleven -wal zou anders over de herstelde DB worden afgespeeld
+                remove_db_files()
                 shutil.move(db_src, DB_FILE)
 
             # Certificaten herstellen
@@ -142,9 +154,9 @@ async def restore_backup(file: UploadFile):
 async def factory_reset():
     """Wist DB en certs, genereert nieuw token, self-signed certs, herstelt permissies en restart service."""
     try:
-        # DB verwijderen
-        if os.path.exists(DB_FILE):
-            os.remove(DB_FILE)
+        # DB verwijderen (eerst de pool sluiten, anders schrijven open connecties door)
+        await pool.close()
+        remove_db_files()
 
         # Nieuwe token genereren
         await ensure_valid_shared_token()
@@ -1,21 +1,27 @@
 import aiosqlite
 import json
-import ipaddress
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse
 from wiretide.api.auth import rbac_required
-from wiretide.db import DB_PATH
-from wiretide.db import get_db
+from wiretide.db import pool, prefix_range
+from wiretide.config_cache import config_cache
+from wiretide.client_controls import client_controls
+from wiretide.changes import changes, cache_headers, CLIENTS, DEVICES
+from wiretide import events
+from wiretide.events import event_hub
 from wiretide.api.auth import require_login
 from fastapi import Form
-from datetime import datetime
-import hashlib
 
 
 router = APIRouter(prefix="/api")
 
+PAGE_MAX = 5000
+# Page size when only `after` is given
+PAGE_DEFAULT = 1000
+
 async def get_devices():
     devices = []
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("SELECT hostname, mac, device_type, last_seen, status_json FROM devices") as cur:
             async for row in cur:
@@ -32,46 +38,144 @@ async def get_devices():
                 })
     return devices
 
-async def get_clients_list():
+async def get_clients_page(router: str | None = None, mac_prefix: str | None = None,
+                           hostname: str | None = None, ip: str | None = None,
+                           limit: int | None = None, after: str | None = None):
+    """Clients from the inventory table, grouped per reporting router.
+
+    Unpaged (no `limit` / `after`), routers come newest report first and
+    include those without clients, unless a client filter is given.
+    Paged, rows come in (router, client MAC) order and the next keyset
+    cursor ("router_mac|client_mac") is returned, or None on the last page.
+    """
+    where, params = [], []
+    if router:
+        where.append("c.router_mac = ?")
+        params.append(router.lower())
+    if mac_prefix:
+        where.append("c.client_mac >= ? AND c.client_mac < ?")
+        params.extend(prefix_range(mac_prefix.lower()))
+    if hostname:
+        where.append("c.hostname >= ? AND c.hostname < ?")
+        params.extend(prefix_range(hostname))
+    if ip:
+        where.append("c.ip = ?")
+        params.append(ip)
+    if after:
+        after_router, _, after_client = after.lower().partition("|")
+        where.append("(c.router_mac > ? OR (c.router_mac = ? AND c.client_mac > ?))")
+        params.extend((after_router, after_router, after_client))
     query = """
-        SELECT ds.mac, d.hostname, ds.clients, ds.updated_at
-        FROM device_status ds
-        LEFT JOIN devices d ON ds.mac = d.mac
-        WHERE ds.clients IS NOT NULL
-        ORDER BY ds.updated_at DESC
+        SELECT c.router_mac, d.hostname, ds.updated_at, c.client_mac, c.ip, c.hostname, c.last_seen
+        FROM clients c
+        LEFT JOIN devices d ON d.mac = c.router_mac
+        LEFT JOIN device_status ds ON ds.mac = c.router_mac
     """
-    results = []
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(query) as cursor:
-            async for row in cursor:
-                mac, hostname, clients_json, updated_at = row
-                try:
-                    clients = json.loads(clients_json)
-                    for client in clients:
-                        client["block_inet"] = await is_blocked(client.get("mac", "").lower())
-                except Exception:
-                    clients = []
-                results.append({
-                    "mac": mac,
-                    "hostname": hostname or "(unknown)",
-                    "client_count": len(clients),
-                    "clients": clients,
-                    "updated_at": updated_at,
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY c.router_mac, c.client_mac"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit + 1)
+
+    blocked = await client_controls.blocked_clients()
+    results = {}
+    rows = 0
+    next_cursor = last_key = None
+    paged = bool(limit or after)
+    async with pool.reader() as db:
+        if not paged:
+            routers = """
+                SELECT ds.mac, d.hostname, ds.updated_at
+                FROM device_status ds
+                LEFT JOIN devices d ON d.mac = ds.mac
+            """
+            router_params = []
+            if router:
+                routers += " WHERE ds.mac = ?"
+                router_params.append(router.lower())
+            routers += " ORDER BY ds.updated_at DESC"
+            async with db.execute(routers, router_params) as cursor:
+                async for router_mac, router_name, updated_at in cursor:
+                    results[router_mac] = _router_entry(router_mac, router_name, updated_at)
+        async with db.execute(query, params) as cursor:
+            async for router_mac, router_name, updated_at, client_mac, client_ip, client_name, last_seen in cursor:
+                if limit and rows == limit:
+                    # One row past the page: continue after the last client returned
+                    next_cursor = last_key
+                    break
+                rows += 1
+                last_key = f"{router_mac}|{client_mac}"
+                entry = results.get(router_mac)
+                if entry is None:
+                    entry = results[router_mac] = _router_entry(router_mac, router_name, updated_at)
+                entry["clients"].append({
+                    "mac": client_mac,
+                    "ip": client_ip,
+                    "hostname": client_name,
+                    "last_seen": last_seen,
+                    "block_inet": client_mac in blocked,
                 })
-    return results
-    
+                entry["client_count"] += 1
+    groups = list(results.values())
+    if mac_prefix or hostname or ip:
+        groups = [g for g in groups if g["clients"]]
+    return groups, next_cursor
+
+
+def _router_entry(router_mac: str, router_name: str | None, updated_at) -> dict:
+    return {
+        "mac": router_mac,
+        "hostname": router_name or "(unknown)",
+        "client_count": 0,
+        "clients": [],
+        "updated_at": updated_at,
+    }
+
+
+async def get_clients_list(**filters):
+    """All matching clients, grouped per router (no paging)."""
+    groups, _ = await get_clients_page(**filters)
+    return groups
+
+
 async def is_blocked(client_mac: str) -> bool:
-    client_mac = client_mac.lower()
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT block_internet FROM client_controls WHERE client_mac = ?", (client_mac,))
-        row = await cur.fetchone()
-        return bool(row and row[0])
+    return await client_controls.is_blocked(client_mac)
 
 
 @router.get("/clients", dependencies=[rbac_required("devices:view")])
-async def list_clients():
-    """Return the current list of connected clients (read-only)."""
-    return await get_clients_list()
+async def list_clients(
+    request: Request,
+    router: str | None = None,
+    mac_prefix: str | None = None,
+    hostname: str | None = None,
+    ip: str | None = None,
+    limit: int | None = Query(None, ge=1, le=PAGE_MAX),
+    after: str | None = None,
+):
+    """Return the current list of connected clients (read-only).
+
+    Optional filters: reporting router MAC, client MAC prefix, hostname prefix, exact IP.
+    Without `limit` and `after` every matching client is returned in one response,
+    routers newest report first (including routers without clients).
+    With `limit` (or `after`, which pages by PAGE_DEFAULT) the response is a page;
+    pass the X-Next-Cursor header back as `after`.
+    Answers 304 while the client inventory and the routers' status are unchanged
+    (If-None-Match); each router group carries its status `updated_at`.
+    """
+    etag = changes.etag(CLIENTS, DEVICES)
+    not_modified = changes.not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    if after and limit is None:
+        limit = PAGE_DEFAULT
+    groups, next_cursor = await get_clients_page(
+        router=router, mac_prefix=mac_prefix, hostname=hostname, ip=ip, limit=limit, after=after
+    )
+    headers = cache_headers(etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return JSONResponse(groups, headers=headers)
 
 @router.post("/clients/block-toggle", dependencies=[Depends(require_login)])
 async def toggle_block(
@@ -82,46 +186,12 @@ async def toggle_block(
     router_mac = router_mac.lower()
     client_mac = client_mac.lower()
 
-    # ✅ Correcte parameter-volgorde bij insert
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            INSERT INTO client_controls (router_mac, client_mac, block_internet)
-            VALUES (?, ?, ?)
-            ON CONFLICT(router_mac, client_mac) DO UPDATE SET block_internet=excluded.block_internet
-        """, (router_mac, client_mac, int(enabled)))
-        await db.commit()
-
-    # 🔍 Debug output router_mac
-    print("Router_mac in query:", router_mac)
-
-    # 🔄 Haal ALLE geblokkeerde clients op voor deze router
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute(
-            "SELECT client_mac FROM client_controls WHERE block_internet=1 AND router_mac=?",
-            (router_mac,)
-        )
-        all_controls = [
-            {"mac": row[0], "block_internet": True}
-            async for row in cur
-        ]
-
-    # 📦 Bouw config package
-    package = {
-        "client_controls": all_controls
-    }
-    sha = hashlib.sha256(
-        json.dumps(package, sort_keys=True, separators=(',', ':')).encode()
-    ).hexdigest()
-
-    # 💾 Schrijf config blob weg voor deze router
-    async with aiosqlite.connect(DB_PATH) as db:
-        blob = json.dumps({"package": package, "sha256": sha})
-        await db.execute("""
-            INSERT INTO device_configs (mac, config, created_at)
-            VALUES (?, ?, ?)
-            ON CONFLICT(mac) DO UPDATE SET config=excluded.config, created_at=excluded.created_at
-        """, (router_mac, blob, datetime.now()))
-        await db.commit()
+    async with pool.writer() as db:
+        await client_controls.set_block(db, router_mac, client_mac, enabled)
+    config_cache.invalidate(router_mac)
+    changes.bump(CLIENTS, macs=[router_mac])
+    event_hub.publish(events.CLIENTS, "client.blocked",
+                      {"router_mac": router_mac, "client_mac": client_mac, "block": enabled})
 
     return {"status": "ok", "client_mac": client_mac, "block": enabled}
 
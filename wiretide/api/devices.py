@@ -1,45 +1,35 @@
-from fastapi import APIRouter, Request, HTTPException, Form, Depends, Body 
-from fastapi.responses import JSONResponse, HTMLResponse 
+from fastapi import APIRouter, Request, HTTPException, Form, Depends, Query
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.templating import Jinja2Templates 
 from pydantic import BaseModel 
-from datetime import timezone, datetime 
-import json, enum, aiosqlite, hashlib 
+from datetime import datetime, timezone
+import json, enum, hashlib, asyncio, base64
 from wiretide.tokens import get_shared_token 
-from wiretide.db import DB_PATH 
+from wiretide.db import pool, prefix_range
 from wiretide.api.auth import require_login, rbac_required 
-from wiretide.models import DeviceStatus 
-from fastapi import APIRouter, Request, Depends, Body 
-from fastapi.responses import JSONResponse 
+from wiretide.models import StatusPayload, ClientChunk
+from wiretide.inventory import client_inventory, client_uploads, UploadError
+from wiretide.ingest import ingestor, IngestQueueFull, RETRY_AFTER
+from wiretide.delta import status_states
+from wiretide.liveness import liveness, STATES
+from wiretide.secevents import security_events
+from wiretide.secstats import security_stats
+from wiretide.changes import changes, cache_headers, DEVICES, CLIENTS
+from wiretide import events
+from wiretide.events import event_hub
+from wiretide.config_cache import config_cache, etag_matches
+from wiretide.notify import config_notifier
+from wiretide.logging import log_context
 from wiretide.api.auth import require_api_token
-from wiretide.db import DB_PATH 
-from datetime import datetime, timezone 
-import aiosqlite 
-import json 
 import logging
 
 router = APIRouter()
 logger = logging.getLogger("wiretide")
 
 templates = Jinja2Templates(directory="wiretide/templates")
-router = APIRouter()
-
-
-# --------------- Helpers ----------------
-
-async def require_api_token(request: Request):
-    token = request.headers.get("X-API-Token")
-    if not token:
-        auth_header = request.headers.get("Authorization", "")
-        if auth_header.startswith("Bearer "):
-            token = auth_header[len("Bearer "):].strip()
-    if not token:
-        raise HTTPException(status_code=400, detail="Missing API token")
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token'")
-        row = await cursor.fetchone()
-    if not row or token.strip() != (row[0] or "").strip():
-        raise HTTPException(status_code=403, detail="Invalid API token")
+# Upper bound for /config/wait; keep below nginx proxy_read_timeout
+LONG_POLL_MAX = 300
 
 
 # --------------- Models ----------------
@@ -63,7 +53,9 @@ class DeviceType(str, enum.Enum):
 @router.post("/register")
 async def register_device(device: DeviceRegistration, request: Request):
     ip = request.client.host
-    async with aiosqlite.connect(DB_PATH) as db:
+    # Same UTC ISO format as status reports, so last_seen sorts as a string
+    now = datetime.now(timezone.utc).isoformat()
+    async with pool.writer() as db:
         async with db.execute("SELECT id, status FROM devices WHERE mac = ?", (device.mac,)) as cursor:
             existing = await cursor.fetchone()
         if existing:
@@ -71,133 +63,120 @@ async def register_device(device: DeviceRegistration, request: Request):
             new_status = 'waiting' if current_status == 'removed' else current_status
             await db.execute(
                 "UPDATE devices SET hostname = ?, ip = ?, last_seen = ?, status = ? WHERE id = ?",
-                (device.hostname, ip, datetime.now(), new_status, device_id)
+                (device.hostname, ip, now, new_status, device_id)
             )
         else:
             await db.execute(
-                "INSERT INTO devices (hostname, ip, mac, ssh_fingerprint, ssh_enabled, status) "
-                "VALUES (?, ?, ?, ?, ?, ?)",
-                (device.hostname, ip, device.mac, device.ssh_fingerprint, device.ssh_enabled, 'waiting')
+                "INSERT INTO devices (hostname, ip, mac, ssh_fingerprint, ssh_enabled, status, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (device.hostname, ip, device.mac, device.ssh_fingerprint, device.ssh_enabled, 'waiting', now)
             )
         await db.commit()
+    config_cache.invalidate(device.mac)
+    liveness.track(device.mac)
+    # Router hostnames show on the clients pages too
+    changes.bump(DEVICES, CLIENTS, macs=[device.mac])
+    event_hub.publish(events.DEVICES, "device.registered", {"mac": device.mac, "hostname": device.hostname, "ip": ip})
     return {"status": "ok"}
 
 
 
-@router.post("/status", dependencies=[Depends(require_api_token)])
-async def accept_status(request: Request):
-    # Ruwe request body loggen
-    raw_body = await request.body()
-    with open("/tmp/wt-debug-raw.txt", "wb") as f:
-        f.write(raw_body)
+async def ingest_status(request: Request):
+    """Parse and queue one agent status report.
 
-    # JSON proberen te parsen
-    try:
-        payload = await request.json()
-    except Exception as e:
-        return JSONResponse({"error": "invalid json", "details": str(e)}, status_code=400)
+    Returns (ack, None) on success or (None, error response); raises 503 when
+    the ingest queue is full. Shared by /status and /sync.
 
-    # JSON loggen voor inspectie
-    with open("/tmp/wt-debug-payload.json", "w") as f:
-        json.dump(payload, f, indent=2)
+    A request with X-Status-Base carries a merge patch instead of the full
+    payload; 409 tells the agent to resend in full.
+    """
+    body = await request.body()
 
-    mac = (payload.get("mac") or "").lower()
-    if not mac:
-        return JSONResponse({"error": "missing mac"}, status_code=400)
-
-    s = payload.get("settings") or {}
-    clients_raw = payload.get("clients", [])
-
-    def pick(*keys, default=None):
-        for k in keys:
-            if k in s and s[k] not in (None, ""):
-                return s[k]
-            if k in payload and payload[k] not in (None, ""):
-                return payload[k]
-        return default
-
-    model       = pick("model", default="unknown")
-    wan_ip      = pick("wan_ip")
-    dns         = pick("dns", "dns_servers", default=[])
-    ntp         = pick("ntp", "ntp_synced", default=False)
-    fw_state    = pick("firewall", "firewall_state", default=True)
-    fw_profile  = pick("firewall_profile", "firewall_profile_active")
-    sec_raw     = pick("security_log_samples", default=[])
-    ssh_enabled = bool(payload.get("ssh_enabled"))
-
-    # DNS-parsing
-    if isinstance(dns, str):
-        try:
-            maybe = json.loads(dns)
-            dns_list = maybe if isinstance(maybe, list) else [dns]
-        except Exception:
-            dns_list = [x.strip() for x in dns.split(",") if x.strip()]
-    elif isinstance(dns, list):
-        dns_list = [str(x) for x in dns]
-    else:
-        dns_list = []
+    # Delta report: RFC 7396 merge patch against the last payload we acknowledged
+    base = (request.headers.get("X-Status-Base") or "").strip()
+    try:
+        if base:
+            patch_mac = (request.headers.get("X-MAC") or "").lower().strip()
+            state = status_states.patch(patch_mac, base, json.loads(body))
+            if state is None:
+                return None, JSONResponse(
+                    {"error": "resync", "details": "unknown status base, send the full payload"},
+                    status_code=409,
+                )
+            status = StatusPayload.model_validate(state)
+        else:
+            # Keep the raw bytes as delta base; they are only decoded if a patch arrives
+            state = body
+            status = StatusPayload.model_validate_json(body)
+    except ValueError as e:
+        return None, JSONResponse({"error": "invalid json", "details": str(e)}, status_code=400)
+
+    if not status.mac:
+        return None, JSONResponse({"error": "missing mac"}, status_code=400)
+
+    report = status.to_report()
+    mac = report["mac"]
+    log_context(mac=mac)
+    try:
+        ingestor.submit(report)
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Status ingest busy, retry later",
+            headers={"Retry-After": str(RETRY_AFTER)},
+        )
 
-    # Security-logs
-    if isinstance(sec_raw, list):
-        sec_list = [str(x) for x in sec_raw][-50:]
-    elif isinstance(sec_raw, str):
-        sec_list = [ln for ln in sec_raw.splitlines() if ln.strip()][-50:]
-    else:
-        sec_list = []
+    ack = {
+        "status": "ok",
+        "mac": mac,
+        "clients": len(report["clients"]) if report["clients"] is not None else "chunked",
+        "profile": report["firewall_profile_active"],
+        "status_revision": status_states.store(mac, state, patched=bool(base)),
+    }
+    if status.clients_truncated and not status.clients_chunked:
+        ack["clients_truncated"] = True
+    event_hub.publish(events.DEVICES, "device.status", {
+        "mac": mac,
+        "last_seen": report["updated_at"],
+        "clients": ack["clients"],
+        "profile": report["firewall_profile_active"],
+    })
+    return ack, None
 
-    # Clients
-    if isinstance(clients_raw, list):
-        clients_json = json.dumps(clients_raw[:100])
-    else:
-        clients_json = json.dumps([])
+async def lookup_config(mac: str) -> dict:
+    """Return the cached /config entry for an approved device (403 otherwise)."""
+    entry = await config_cache.get(mac)
+    if not entry or not entry["approved"]:
+        raise HTTPException(status_code=403, detail="Unauthorized or unapproved")
+    return entry
 
-    updated_at = datetime.now(timezone.utc).isoformat()
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """
-            INSERT INTO device_status (
-                mac, model, wan_ip, dns_servers, ntp_synced, firewall_state,
-                firewall_profile_active, security_log_samples, updated_at, clients
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(mac) DO UPDATE SET
-                model=excluded.model,
-                wan_ip=excluded.wan_ip,
-                dns_servers=excluded.dns_servers,
-                ntp_synced=excluded.ntp_synced,
-                firewall_state=excluded.firewall_state,
-                firewall_profile_active=excluded.firewall_profile_active,
-                security_log_samples=excluded.security_log_samples,
-                clients=excluded.clients,
-                updated_at=excluded.updated_at
-            """,
-            (
-                mac,
-                str(model),
-                str(wan_ip) if wan_ip else None,
-                json.dumps(dns_list),
-                int(ntp),
-                str(fw_state),
-                str(fw_profile) if fw_profile else None,
-                json.dumps(sec_list),
-                updated_at,
-                clients_json
-            )
-        )
+@router.post("/status", dependencies=[Depends(require_api_token)])
+async def accept_status(request: Request):
+    ack, error = await ingest_status(request)
+    return error or ack
 
-        await db.execute(
-            "UPDATE devices SET last_seen = ?, ssh_enabled = ? WHERE mac = ?",
-            (updated_at, int(ssh_enabled), mac),
-        )
 
-        await db.commit()
+@router.post("/clients/chunk", dependencies=[Depends(require_api_token)])
+async def upload_client_chunk(request: Request):
+    """One piece of a large client table; the last chunk replaces the router's clients."""
+    mac = (request.headers.get("X-MAC") or "").lower().strip()
+    if not mac:
+        raise HTTPException(status_code=401, detail="Missing X-MAC")
+    try:
+        chunk = ClientChunk.model_validate_json(await request.body())
+    except ValueError as e:
+        return JSONResponse({"error": "invalid chunk", "details": str(e)}, status_code=400)
+
+    try:
+        clients = client_uploads.add(mac, chunk.upload, chunk.seq, chunk.to_clients(), chunk.last)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if clients is None:
+        return {"status": "ok", "next": chunk.seq + 1}
+    await client_inventory.replace(mac, clients)
+    return {"status": "ok", "clients": len(clients)}
 
-    return {
-        "status": "ok",
-        "mac": mac,
-        "clients": len(json.loads(clients_json)),
-        "profile": fw_profile
-    }
 
 @router.get("/config", dependencies=[Depends(require_api_token)])
 async def get_config(request: Request):
@@ -205,28 +184,65 @@ async def get_config(request: Request):
     if not mac:
         raise HTTPException(status_code=401, detail="Missing X-MAC")
 
-    async with aiosqlite.connect(DB_PATH) as db:
-        cur = await db.execute("SELECT approved FROM devices WHERE mac = ?", (mac,))
-        row = await cur.fetchone()
-        if not row or not row[0]:
-            raise HTTPException(status_code=403, detail="Unauthorized or unapproved")
+    entry = await lookup_config(mac)
+    etag = entry["etag"]
+    headers = {"ETag": etag} if etag else {}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        config_cache.counters["not_modified"] += 1
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(entry["body"], headers=headers)
 
-        cur = await db.execute(
-            "SELECT config FROM device_configs WHERE mac = ? ORDER BY created_at DESC LIMIT 1",
-            (mac,)
-        )
-        row = await cur.fetchone()
 
-    if not row or not row[0]:
-        return JSONResponse({"package": {}, "available": False, "sha256": None})
+@router.get("/config/wait", dependencies=[Depends(require_api_token)])
+async def wait_config(request: Request, timeout: int = 55):
+    """Long-poll variant of /config.
+
+    Answers immediately if the config differs from If-None-Match, otherwise
+    parks until the device's config changes (200) or `timeout` expires (304).
+    """
+    mac = (request.headers.get("X-MAC") or "").lower().strip()
+    if not mac:
+        raise HTTPException(status_code=401, detail="Missing X-MAC")
+    timeout = max(1, min(timeout, LONG_POLL_MAX))
+
+    if_none_match = request.headers.get("If-None-Match")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        entry = await lookup_config(mac)
+        etag = entry["etag"]
+        headers = {"ETag": etag} if etag else {}
+        if not etag_matches(if_none_match, etag):
+            return JSONResponse(entry["body"], headers=headers)
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not await config_notifier.wait(mac, remaining):
+            config_cache.counters["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+
+@router.post("/sync", dependencies=[Depends(require_api_token)])
+async def sync(request: Request):
+    """Agent cycle in one round trip: accept a status report, return the config delta.
+
+    The agent sends its applied config revision in X-Config-Revision; the
+    "config" member is {"state": "unchanged"} when it still matches.
+    """
+    ack, error = await ingest_status(request)
+    if error:
+        return error
 
     try:
-        cfg = json.loads(row[0]) if isinstance(row[0], str) else row[0]
-        pkg = cfg.get("package", {}) if isinstance(cfg, dict) else {}
-        sha = cfg.get("sha256") if isinstance(cfg, dict) else None
-        return JSONResponse({"package": pkg, "available": True, "sha256": sha})
-    except Exception:
-        return JSONResponse({"package": {}, "available": False, "sha256": None})
+        entry = await lookup_config(ack["mac"])
+    except HTTPException:
+        ack["config"] = {"state": "unapproved"}
+        return ack
+    revision = entry["body"]["revision"]
+    if revision and request.headers.get("X-Config-Revision", "").strip() == revision:
+        config_cache.counters["not_modified"] += 1
+        ack["config"] = {"state": "unchanged", "revision": revision}
+    else:
+        ack["config"] = {"state": "updated", **entry["body"]}
+    return ack
 
 
 @router.get("/config/agent", dependencies=[Depends(require_api_token)])
@@ -235,7 +251,7 @@ async def get_agent_update_config(request: Request):
     if not mac:
         raise HTTPException(status_code=401)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT agent_update_allowed FROM devices WHERE mac = ?", (mac,))
         row = await cursor.fetchone()
         if not row:
@@ -258,75 +274,202 @@ async def get_agent_update_config(request: Request):
 @router.get("/token/{mac}")
 async def get_device_token(mac: str):
     token = await get_shared_token()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT approved FROM devices WHERE mac = ?", (mac,))
         row = await cursor.fetchone()
         if not row or not row[0]:
             raise HTTPException(status_code=403, detail="Device not approved")
     return {"token": token}
 
+# Sort keys for /api/devices; each is backed by an index ending in mac
+DEVICE_SORTS = {"last_seen": "d.last_seen", "hostname": "d.hostname", "mac": "d.mac"}
+DEVICE_PAGE_MAX = 1000
+
+
+def _encode_cursor(key, mac: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([key, mac]).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        key, mac = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return key, mac
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/api/devices")
-async def list_devices(_: str = Depends(require_login)):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            SELECT
-              d.hostname,
-              d.mac,
-              d.ip,
-              COALESCE(ds.updated_at, d.last_seen) AS last_seen,
-              d.status,
-              d.ssh_enabled,
-              d.device_type,
-              d.approved
-            FROM devices d
-            LEFT JOIN device_status ds ON ds.mac = d.mac
-            ORDER BY last_seen DESC
-        """)
-        rows = await cursor.fetchall()
-    return JSONResponse(content=[
-        {
-            "hostname": row[0],
-            "mac": row[1],
-            "ip": row[2],
-            "last_seen": row[3],
-            "status": row[4],
-            "ssh_enabled": bool(row[5]),
-            "device_type": row[6],
-            "approved": bool(row[7]),
-        } for row in rows
-    ])
+async def list_devices(
+    request: Request,
+    status: str | None = None,
+    device_type: str | None = None,
+    approved: bool | None = None,
+    liveness_state: str | None = Query(None, alias="liveness"),
+    hostname: str | None = None,
+    mac_prefix: str | None = None,
+    q: str | None = None,
+    sort: str = "last_seen",
+    order: str | None = None,
+    limit: int = Query(100, ge=1, le=DEVICE_PAGE_MAX),
+    cursor: str | None = None,
+    _: str = Depends(require_login),
+):
+    """One page of devices, keyset-paged.
+
+    Filters: status, device_type, approved, liveness, hostname / MAC prefix
+    (`q` matches either). Sorted by last_seen (newest first), hostname or
+    mac; pass `next_cursor` back as `cursor` for the following page.
+    Answers 304 while no device has changed (If-None-Match).
+    """
+    etag = changes.etag(DEVICES)
+    not_modified = changes.not_modified(request, etag)
+    if not_modified:
+        return not_modified
+
+    if sort not in DEVICE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(DEVICE_SORTS)}")
+    order = order or ("desc" if sort == "last_seen" else "asc")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    column = DEVICE_SORTS[sort]
+
+    where, params = [], []
+    if status:
+        where.append("d.status = ?")
+        params.append(status)
+    if device_type:
+        where.append("d.device_type = ?")
+        params.append(device_type)
+    if approved is not None:
+        where.append("d.approved = ?")
+        params.append(int(approved))
+    if liveness_state:
+        where.append("d.liveness = ?")
+        params.append(liveness_state)
+    if hostname:
+        where.append("d.hostname >= ? AND d.hostname < ?")
+        params.extend(prefix_range(hostname))
+    if mac_prefix:
+        where.append("d.mac >= ? AND d.mac < ?")
+        params.extend(prefix_range(mac_prefix.lower()))
+    if q:
+        where.append("((d.hostname >= ? AND d.hostname < ?) OR (d.mac >= ? AND d.mac < ?))")
+        params.extend(prefix_range(q) + prefix_range(q.lower()))
+    filters = " AND ".join(where) or "1"
+
+    page_where, page_params = list(where), list(params)
+    if cursor:
+        key, after_mac = _decode_cursor(cursor)
+        op = "<" if order == "desc" else ">"
+        page_where.append(f"({column} {op} ? OR ({column} = ? AND d.mac {op} ?))")
+        page_params.extend((key, key, after_mac))
+    direction = order.upper()
+    query = f"""
+        SELECT
+          d.hostname,
+          d.mac,
+          d.ip,
+          d.last_seen,
+          d.status,
+          d.ssh_enabled,
+          d.device_type,
+          d.approved,
+          d.liveness,
+          {column}
+        FROM devices d
+        WHERE {" AND ".join(page_where) or "1"}
+        ORDER BY {column} {direction}, d.mac {direction}
+        LIMIT ?
+    """
+    async with pool.reader() as db:
+        async with db.execute(f"SELECT COUNT(*) FROM devices d WHERE {filters}", params) as cur:
+            total = (await cur.fetchone())[0]
+        async with db.execute(query, page_params + [limit + 1]) as cur:
+            rows = await cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1][9], rows[-1][1])
+    return JSONResponse({
+        "devices": [
+            {
+                "hostname": row[0],
+                "mac": row[1],
+                "ip": row[2],
+                "last_seen": row[3],
+                "status": row[4],
+                "ssh_enabled": bool(row[5]),
+                "device_type": row[6],
+                "approved": bool(row[7]),
+                "liveness": liveness.state(row[1]) or row[8] or "unknown",
+            } for row in rows
+        ],
+        "total": total,
+        "next_cursor": next_cursor,
+    }, headers=cache_headers(etag))
+
+
+@router.get("/api/devices/liveness")
+async def device_liveness(state: str | None = None, _: str = Depends(require_login)):
+    """Device counts per liveness state; `state` also lists the MACs in that state."""
+    if state is not None and state not in STATES:
+        raise HTTPException(status_code=400, detail=f"state must be one of {', '.join(STATES)}")
+    result = {
+        "counts": liveness.counts(),
+        "stale_after": liveness.stale_after,
+        "offline_after": liveness.offline_after,
+    }
+    if state:
+        result["devices"] = liveness.devices_in(state)
+    return result
 
 @router.post("/api/approve")
 async def approve_device(mac: str = Form(...), device_type: str = Form(...), _: str = Depends(require_login)):
     if device_type not in [t.value for t in DeviceType if t != DeviceType.unknown]:
         raise HTTPException(status_code=400, detail="Invalid or missing device type.")
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute(
             "UPDATE devices SET approved = 1, status = 'approved', device_type = ? WHERE mac = ?",
             (device_type, mac)
         )
         await db.commit()
+    config_cache.invalidate(mac)
+    changes.bump(DEVICES, macs=[mac])
+    event_hub.publish(events.DEVICES, "device.approved", {"mac": mac})
     return {"status": "approved"}
 
 @router.post("/api/deny")
 async def deny_device(mac: str = Form(...), _: str = Depends(require_login)):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("UPDATE devices SET status = 'denied' WHERE mac = ?", (mac,))
         await db.commit()
+    config_cache.invalidate(mac)
+    changes.bump(DEVICES, macs=[mac])
+    event_hub.publish(events.DEVICES, "device.denied", {"mac": mac})
     return {"status": "denied"}
 
 @router.post("/api/block")
 async def block_device(mac: str = Form(...), _: str = Depends(require_login)):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("UPDATE devices SET status = 'blocked' WHERE mac = ?", (mac,))
         await db.commit()
+    config_cache.invalidate(mac)
+    changes.bump(DEVICES, macs=[mac])
+    event_hub.publish(events.DEVICES, "device.blocked", {"mac": mac})
     return {"status": "blocked"}
 
 @router.post("/api/remove")
 async def remove_device(mac: str = Form(...), _: str = Depends(require_login)):
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("UPDATE devices SET status = 'removed' WHERE mac = ?", (mac,))
         await db.commit()
+    config_cache.invalidate(mac)
+    liveness.forget(mac)
+    security_events.forget(mac)
+    security_stats.forget(mac)
+    changes.bump(DEVICES, macs=[mac])
+    event_hub.publish(events.DEVICES, "device.removed", {"mac": mac})
     return {"status": "removed"}
 
 @router.get("/clients/{device_type}/{mac}", response_class=HTMLResponse)
@@ -335,7 +478,11 @@ async def device_page(device_type: str, mac: str, request: Request, _: str = Dep
         raise HTTPException(status_code=404)
 
     mac_norm = mac.lower()
-    async with aiosqlite.connect(DB_PATH) as db:
+    etag = changes.etag(mac=mac_norm, user=request.session.get("user"))
+    not_modified = changes.not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    async with pool.reader() as db:
         cursor = await db.execute(
             "SELECT hostname, ip, ssh_enabled, device_type, agent_update_allowed FROM devices WHERE mac = ?", (mac_norm,)
         )
@@ -430,6 +577,7 @@ async def device_page(device_type: str, mac: str, request: Request, _: str = Dep
             "settings": settings,
             "ui_defaults": ui_defaults,
         },
+        headers=cache_headers(etag),
     )
 
 @router.post("/api/queue-config")
@@ -450,7 +598,7 @@ async def queue_config(
     if calculated != sha256:
         raise HTTPException(400, detail="SHA256 mismatch")
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         cursor = await db.execute("SELECT approved FROM devices WHERE mac = ?", (mac,))
         row = await cursor.fetchone()
         if not row:
@@ -466,6 +614,8 @@ async def queue_config(
             SET config=excluded.config, created_at=excluded.created_at
         """, (mac, config_blob, datetime.now()))
         await db.commit()
+    config_cache.invalidate(mac)
+    changes.bump(macs=[mac])
 
     return {"status": "queued", "keys": list(package.keys())}
     
@@ -475,12 +625,13 @@ async def toggle_agent_update(mac: str, request: Request):
     form = await request.form()
     enabled = form.get("enabled", "false").lower() == "true"
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         cursor = await db.execute("SELECT COUNT(*) FROM devices WHERE mac = ?", (mac,))
         if (await cursor.fetchone())[0] == 0:
             raise HTTPException(status_code=404, detail="Device not found")
         await db.execute("UPDATE devices SET agent_update_allowed = ? WHERE mac = ?", (int(enabled), mac))
         await db.commit()
+    changes.bump(macs=[mac])
 
     return {"status": "ok", "enabled": enabled}
 
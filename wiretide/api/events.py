@@ -0,0 +1,66 @@
+# wiretide/api/events.py
+import asyncio
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from wiretide.api.auth import rbac_required
+from wiretide.events import event_hub, TOPICS
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+# Streams end after this long and the browser reconnects (bounds shutdown waits)
+STREAM_MAX_SECONDS = int(os.getenv("WIRETIDE_EVENTS_STREAM_MAX", "300"))
+RETRY_MS = 3000
+
+
+@router.get("/api/events", dependencies=[rbac_required("devices:view")])
+async def stream_events(request: Request, topics: str | None = None):
+    """Server-Sent Events stream of device and client changes for the dashboard.
+
+    `topics` is a comma list of "devices" and/or "clients" (default: both).
+    A "resync" event means events were missed and the page should refetch.
+    """
+    wanted = [t.strip() for t in topics.split(",") if t.strip()] if topics else list(TOPICS)
+    unknown = set(wanted) - set(TOPICS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown topics: {', '.join(sorted(unknown))}")
+
+    if event_hub.full:
+        event_hub.counters["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Too many event subscribers", headers={"Retry-After": "30"})
+
+    last_event_id = request.headers.get("Last-Event-ID")
+
+    async def frames():
+        # Subscribed only once the stream runs, so the finally below always unsubscribes
+        sub = event_hub.subscribe(wanted)
+        if sub is None:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_MAX_SECONDS
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode()
+            # Reconnected after missing events: let the page catch up
+            if last_event_id and last_event_id != str(event_hub.last_id):
+                yield event_hub.resync_frame()
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), min(KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keepalive\n\n"
+        finally:
+            event_hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,131 @@
+# wiretide/api/export.py
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from wiretide.api.auth import rbac_required
+from wiretide.client_controls import client_controls
+from wiretide.db import pool
+from wiretide.liveness import liveness
+
+router = APIRouter()
+
+# Rows fetched per query; the reader goes back to the pool between chunks
+CHUNK_ROWS = 1000
+
+DEVICE_COLUMNS = (
+    "mac", "hostname", "ip", "status", "device_type", "approved", "ssh_enabled", "liveness",
+    "last_seen", "agent_version", "model", "wan_ip", "firewall_profile", "ntp_synced",
+)
+DEVICE_QUERY = """
+    SELECT d.mac, d.hostname, d.ip, d.status, d.device_type, d.approved, d.ssh_enabled, d.liveness,
+           COALESCE(ds.updated_at, d.last_seen), d.agent_version, ds.model, ds.wan_ip,
+           ds.firewall_profile_active, ds.ntp_synced
+    FROM devices d
+    LEFT JOIN device_status ds ON ds.mac = d.mac
+    WHERE d.mac > ?
+    ORDER BY d.mac
+    LIMIT ?
+"""
+
+CLIENT_COLUMNS = ("router_mac", "router_hostname", "client_mac", "ip", "hostname", "last_seen", "blocked")
+CLIENT_QUERY = """
+    SELECT c.router_mac, d.hostname, c.client_mac, c.ip, c.hostname, c.last_seen
+    FROM clients c
+    LEFT JOIN devices d ON d.mac = c.router_mac
+    WHERE c.router_mac > ? OR (c.router_mac = ? AND c.client_mac > ?)
+    ORDER BY c.router_mac, c.client_mac
+    LIMIT ?
+"""
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def _device_rows():
+    after = ""
+    while True:
+        async with pool.reader() as db:
+            async with db.execute(DEVICE_QUERY, (after, CHUNK_ROWS)) as cur:
+                rows = await cur.fetchall()
+        if not rows:
+            return
+        yield [
+            (mac, hostname, ip, status, device_type, bool(approved), bool(ssh_enabled),
+             liveness.state(mac) or state, last_seen, agent_version, model, wan_ip, profile,
+             None if ntp is None else bool(ntp))
+            for mac, hostname, ip, status, device_type, approved, ssh_enabled, state,
+                last_seen, agent_version, model, wan_ip, profile, ntp in rows
+        ]
+        after = rows[-1][0]
+
+
+async def _client_rows():
+    blocked = await client_controls.blocked_clients()
+    after = ("", "")
+    while True:
+        async with pool.reader() as db:
+            async with db.execute(CLIENT_QUERY, (after[0], after[0], after[1], CHUNK_ROWS)) as cur:
+                rows = await cur.fetchall()
+        if not rows:
+            return
+        yield [(*row, row[2] in blocked) for row in rows]
+        after = (rows[-1][0], rows[-1][2])
+
+
+async def _encode(chunks, columns: tuple, fmt: str):
+    """Turn row chunks into NDJSON lines or CSV (with header) bytes."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(columns)
+        async for rows in chunks:
+            writer.writerows(rows)
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue().encode()
+    else:
+        async for rows in chunks:
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), separators=(",", ":")) + "\n" for row in rows
+            ).encode()
+
+
+async def _gzip(parts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _export(name: str, chunks, columns: tuple, fmt: str, gzip: bool) -> StreamingResponse:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    filename = f"wiretide-{name}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{fmt}"
+    body, media_type = _encode(chunks, columns, fmt), MEDIA_TYPES[fmt]
+    if gzip:
+        # A .gz file download, not Content-Encoding, so clients keep it compressed
+        body, media_type = _gzip(body), "application/gzip"
+        filename += ".gz"
+    headers = {"Cache-Control": "no-store", "Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+@router.get("/api/export/devices", dependencies=[rbac_required("devices:view")])
+async def export_devices(format: str = "ndjson", gzip: bool = False):
+    """Stream the full device inventory (one row per device) as NDJSON or CSV."""
+    return _export("devices", _device_rows(), DEVICE_COLUMNS, format, gzip)
+
+
+@router.get("/api/export/clients", dependencies=[rbac_required("devices:view")])
+async def export_clients(format: str = "ndjson", gzip: bool = False):
+    """Stream the full client inventory (one row per client per router) as NDJSON or CSV."""
+    return _export("clients", _client_rows(), CLIENT_COLUMNS, format, gzip)
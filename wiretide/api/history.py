@@ -0,0 +1,34 @@
+# wiretide/api/history.py
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, HTTPException
+
+from wiretide.api.auth import rbac_required
+from wiretide.history import status_history, RESOLUTIONS
+
+router = APIRouter()
+
+
+@router.get("/api/devices/{mac}/history", dependencies=[rbac_required("devices:view")])
+async def device_history(
+    mac: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    resolution: int | None = None,
+):
+    """Status history for one device between start and end (default: last 24h).
+
+    Resolution is 60, 3600 or 86400 seconds; picked automatically when omitted.
+    """
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=24)
+    start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution is None:
+        resolution = status_history.pick_resolution(start_ts, end_ts)
+    elif resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {list(RESOLUTIONS)}")
+
+    points = await status_history.query(mac.lower(), start_ts, end_ts, resolution)
+    return {"mac": mac.lower(), "resolution": resolution, "start": start_ts, "end": end_ts, "points": points}
@@ -1,43 +1,58 @@
 # wiretide/api/logs.py
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import os
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import FileResponse
-import os, re
 
 from wiretide.api.auth import rbac_required
-
-LOG_FILE = "/var/log/wiretide.log"
+from wiretide.logging import LOG_FILE, BACKUP_COUNT
+from wiretide.logreader import log_files, read_entries
 
 router = APIRouter()
 
+LOG_LEVELS = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 2000
+
+
 @router.get("/api/logs", dependencies=[rbac_required("logs:view")])
-async def get_logs(level: str = "ALL"):
-    """Return the last 200 log lines, optionally filtered by level."""
+async def get_logs(level: str = "ALL", limit: int = DEFAULT_LIMIT, cursor: str | None = None,
+                   since: datetime | None = None, until: datetime | None = None):
+    """Return the newest log entries (live and rotated files), optionally filtered.
+
+    `limit` counts entries; a traceback stays with the line that logged it.
+    Pass `next_cursor` back as `cursor` to page towards older entries.
+    """
     level = level.upper()
-    valid_levels = {"ALL", "INFO", "WARNING", "ERROR"}
-    if level not in valid_levels:
+    if level != "ALL" and level not in LOG_LEVELS:
         raise HTTPException(status_code=400, detail="Invalid log level")
+    limit = max(1, min(limit, MAX_LIMIT))
 
-    try:
-        with open(LOG_FILE, "r") as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        return {"lines": ["Log file not found."]}
+    paths = log_files(LOG_FILE, BACKUP_COUNT)
+    if not paths:
+        return {"lines": ["Log file not found."], "next_cursor": None}
 
-    # Keep last 200 lines
-    lines = lines[-200:]
+    # Timestamps in the log are naive local time
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone().replace(tzinfo=None)
+    if until is not None and until.tzinfo is not None:
+        until = until.astimezone().replace(tzinfo=None)
 
-    # Filter by level if needed
-    if level != "ALL":
-        regex = re.compile(rf"\b{re.escape(level)}\b")
-        lines = [line for line in lines if regex.search(line)]
-    return {"lines": lines}
+    try:
+        lines, next_cursor = await asyncio.to_thread(
+            read_entries, paths, limit, cursor,
+            None if level == "ALL" else {level}, since, until,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"lines": lines, "next_cursor": next_cursor}
 
 
 @router.get("/api/logs/download", dependencies=[rbac_required("logs:download")])
 async def download_logs():
     """Download the raw Wiretide log file."""
-    try:
-        return FileResponse(LOG_FILE, filename="wiretide.log")
-    except FileNotFoundError:
+    if not os.path.exists(LOG_FILE):
         raise HTTPException(status_code=404, detail="Log file not found")
-
+    return FileResponse(LOG_FILE, filename="wiretide.log")
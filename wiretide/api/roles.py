@@ -1,7 +1,7 @@
 # wiretide/api/roles.py
 from fastapi import APIRouter, Depends, HTTPException, Form, Path
-import aiosqlite
-from wiretide.db import DB_PATH
+from wiretide.db import pool
+from wiretide.permission_cache import permission_cache
 from wiretide.api.auth import rbac_required
 
 router = APIRouter(prefix="/api/roles")
@@ -10,7 +10,7 @@ router = APIRouter(prefix="/api/roles")
 @router.get("/", dependencies=[rbac_required("roles:manage")])
 async def list_roles():
     """Return all roles with their permissions."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         # Get all roles
         cursor = await db.execute("SELECT id, name FROM roles")
         roles = [{"id": row[0], "name": row[1], "permissions": []} for row in await cursor.fetchall()]
@@ -54,7 +54,7 @@ async def update_role_permissions(
     """
     perms = [p.strip() for p in permissions.split(",") if p.strip()]
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         # Ensure the role exists
         cursor = await db.execute("SELECT id FROM roles WHERE id = ?", (role_id,))
         row = await cursor.fetchone()
@@ -65,12 +65,12 @@ async def update_role_permissions(
         await db.execute("DELETE FROM role_permissions WHERE role_id = ?", (role_id,))
 
         # Insert new permissions
-        for perm in perms:
-            await db.execute(
-                "INSERT OR IGNORE INTO role_permissions (role_id, permission) VALUES (?, ?)",
-                (role_id, perm)
-            )
+        await db.executemany(
+            "INSERT OR IGNORE INTO role_permissions (role_id, permission) VALUES (?, ?)",
+            [(role_id, perm) for perm in perms]
+        )
         await db.commit()
+    permission_cache.bump()
 
     return {"status": "updated", "role_id": role_id, "permissions": perms}
 
@@ -0,0 +1,62 @@
+# wiretide/api/security.py
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException
+
+from wiretide.api.auth import rbac_required
+from wiretide.secevents import security_events
+from wiretide.secstats import security_stats
+
+router = APIRouter()
+
+MAX_LIMIT = 1000
+MAX_TOP = 100
+
+
+@router.get("/api/security/events", dependencies=[rbac_required("devices:view")])
+async def list_security_events(
+    mac: str | None = None,
+    q: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 100,
+    cursor: int | None = None,
+):
+    """Stored WTSEC log lines, newest first, across the fleet or for one device.
+
+    `q` is full-text: every word must occur in the line (e.g. "SRC=10.0.0.5 DPT=22").
+    `since`/`until` bound the time the controller received the line.
+    Pass `next_cursor` back as `cursor` for the next (older) page.
+    """
+    if not 1 <= limit <= MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LIMIT}")
+    since_ts = int(since.timestamp()) if since else None
+    until_ts = int(until.timestamp()) if until else None
+    if since_ts is not None and until_ts is not None and since_ts > until_ts:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    events = await security_events.query(
+        mac=mac.lower() if mac else None, text=q, since=since_ts, until=until_ts,
+        limit=limit, before=cursor,
+    )
+    next_cursor = events[-1]["id"] if len(events) == limit else None
+    return {"events": events, "next_cursor": next_cursor}
+
+
+@router.get("/api/security/stats", dependencies=[rbac_required("devices:view")])
+async def security_stats_summary(top: int = 10):
+    """Live WTSEC event rates: top devices, sources and rule prefixes, plus spikes.
+
+    Computed from in-memory sliding windows (see wiretide/secstats.py).
+    """
+    if not 1 <= top <= MAX_TOP:
+        raise HTTPException(status_code=400, detail=f"top must be between 1 and {MAX_TOP}")
+    return security_stats.summary(top)
+
+
+@router.get("/api/security/stats/{mac}", dependencies=[rbac_required("devices:view")])
+async def device_security_stats(mac: str, top: int = 10):
+    """Per-bucket event counts, top source IPs and spikes for one device."""
+    if not 1 <= top <= MAX_TOP:
+        raise HTTPException(status_code=400, detail=f"top must be between 1 and {MAX_TOP}")
+    return security_stats.device(mac.lower(), top)
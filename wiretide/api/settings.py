@@ -2,12 +2,11 @@ from fastapi import APIRouter, Request, Form, Depends
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from wiretide.timeutil import format_local
-import aiosqlite
 from datetime import timedelta
 
 from wiretide.api.auth import require_login, rbac_required
 from wiretide.tokens import ensure_valid_shared_token, update_token
-from wiretide.db import DB_PATH
+from wiretide.db import pool
 
 templates = Jinja2Templates(directory="wiretide/templates")
 templates.env.filters["localtime"] = format_local
@@ -17,7 +16,7 @@ router = APIRouter()
 async def settings_page(request: Request):
     """Render the settings page, showing the shared token and expiry."""
     token = await ensure_valid_shared_token()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.reader() as db:
         cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token_expiry'")
         expiry_row = await cursor.fetchone()
         expiry = expiry_row[0] if expiry_row else "Unknown"
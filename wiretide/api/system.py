@@ -1,13 +1,27 @@
 # wiretide/api/system.py
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse, FileResponse, RedirectResponse
-import os, re, subprocess, socket, hashlib, threading, time
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, RedirectResponse
+import os, subprocess, socket, hashlib, threading, time
 from fastapi import Form
 from wiretide.config import get_config_value
-from wiretide.db import DB_PATH
+from wiretide.db import pool
 from wiretide.api.auth import rbac_required
+from wiretide.ingest import ingestor
+from wiretide.token_cache import token_cache
+from wiretide.inventory import client_inventory, client_uploads
+from wiretide.client_controls import client_controls
+from wiretide.history import status_history
+from wiretide.secevents import security_events
+from wiretide.secstats import security_stats
+from wiretide.delta import status_states
+from wiretide.liveness import liveness
+from wiretide.changes import changes
+from wiretide.events import event_hub
+from wiretide.logging import handler as log_handler
+from wiretide.permission_cache import permission_cache
+from wiretide.config_cache import config_cache
+from wiretide.notify import config_notifier
 
-LOG_FILE = "/var/log/wiretide.log"
 CERT_DIR = "wiretide/certs"
 
 router = APIRouter()
@@ -34,36 +48,6 @@ def get_process_uptime():
         return None
 
 
-@router.get("/api/logs", dependencies=[rbac_required("logs:view")])
-async def get_logs(level: str = "ALL"):
-    """Return the last 200 log lines, optionally filtered by level."""
-    level = level.upper()
-    valid_levels = {"ALL", "INFO", "WARNING", "ERROR"}
-    if level not in valid_levels:
-        raise HTTPException(status_code=400, detail="Invalid log level")
-
-    try:
-        with open(LOG_FILE, "r") as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        return {"lines": ["Log file not found."]}
-
-    lines = lines[-200:]
-    if level != "ALL":
-        regex = re.compile(rf"\b{re.escape(level)}\b")
-        lines = [line for line in lines if regex.search(line)]
-    return {"lines": lines}
-
-
-@router.get("/api/logs/download", dependencies=[rbac_required("logs:download")])
-async def download_logs():
-    """Download the raw log file."""
-    try:
-        return FileResponse(LOG_FILE, filename="wiretide.log")
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Log file not found")
-
-
 @router.get("/api/agent-update/settings", dependencies=[rbac_required("system:view")])
 async def get_agent_update_settings():
     updates_enabled = await get_config_value("agent_updates_enabled", "false") == "true"
@@ -72,12 +56,35 @@ async def get_agent_update_settings():
 @router.post("/api/agent-update/settings", dependencies=[rbac_required("system:edit")])
 async def update_agent_update_settings(enabled: str = Form(...)):
     value = "true" if enabled == "true" else "false"
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("UPDATE config SET value = ? WHERE key = 'agent_updates_enabled'", (value,))
         await db.commit()
     return {"status": "ok", "enabled": value}
 
 
+@router.get("/api/metrics", dependencies=[rbac_required("system:view")])
+async def metrics():
+    """Return in-process counters for the ingest pipeline and caches."""
+    return {
+        "ingest": ingestor.stats(),
+        "token_cache": token_cache.stats(),
+        "permission_cache": permission_cache.stats(),
+        "config_cache": config_cache.stats(),
+        "config_waiters": config_notifier.stats(),
+        "client_inventory": client_inventory.stats(),
+        "client_uploads": client_uploads.stats(),
+        "client_controls": client_controls.stats(),
+        "status_history": status_history.stats(),
+        "security_events": security_events.stats(),
+        "security_stats": security_stats.stats(),
+        "status_deltas": status_states.stats(),
+        "liveness": liveness.stats(),
+        "dashboard_etags": changes.stats(),
+        "events": event_hub.stats(),
+        "logging": log_handler.stats(),
+    }
+
+
 @router.get("/api/system-info", dependencies=[rbac_required("system:view")])
 async def system_info():
     """Return controller diagnostics: hostname, IP, controller uptime, version, certs, agent info."""
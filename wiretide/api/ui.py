@@ -4,10 +4,13 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 
 from wiretide.api.auth import require_login
+from wiretide.changes import changes, cache_headers, CLIENTS, DEVICES
 
 templates = Jinja2Templates(directory="wiretide/templates")
 router = APIRouter()
 
+CLIENTS_PAGE_SIZE = 500
+
 @router.get("/", include_in_schema=False)
 async def root_redirect():
     """Redirect the root URL to the dashboard."""
@@ -19,9 +22,16 @@ async def serve_index(request: Request, _: str = Depends(require_login)):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @router.get("/clients", response_class=HTMLResponse)
-async def serve_clients(request: Request, _: str = Depends(require_login)):
-    """Global Clients page (HTML)."""
-    # We'll fetch the clients list via the API function (see next section)
-    from wiretide.api.clients import get_clients_list  # import helper
-    clients = await get_clients_list()
-    return templates.TemplateResponse("clients.html", {"request": request, "clients": clients})
+async def serve_clients(request: Request, after: str | None = None, _: str = Depends(require_login)):
+    """Global Clients page (HTML), paged over the client inventory; 304 while unchanged."""
+    etag = changes.etag(CLIENTS, DEVICES, user=request.session.get("user"))
+    not_modified = changes.not_modified(request, etag)
+    if not_modified:
+        return not_modified
+    from wiretide.api.clients import get_clients_page  # import helper
+    clients, next_cursor = await get_clients_page(limit=CLIENTS_PAGE_SIZE, after=after)
+    return templates.TemplateResponse(
+        "clients.html",
+        {"request": request, "clients": clients, "next_cursor": next_cursor, "paged": bool(after), "etag": etag},
+        headers=cache_headers(etag),
+    )
@@ -0,0 +1,65 @@
+# wiretide/changes.py
+import hashlib
+import secrets
+
+from fastapi import Request, Response
+
+from wiretide.config_cache import etag_matches
+
+DEVICES = "devices"
+CLIENTS = "clients"
+
+
+class ChangeCounters:
+    """Monotonic change counters behind the dashboard ETags.
+
+    Every `bump()` advances one global counter and stamps its value on the
+    named resources ("devices", "clients") and on the device MACs involved.
+    ETags are built from those stamps alone, so a poll whose ETag still
+    matches gets a 304 without a database query. The boot id makes ETags
+    from before a restart stale.
+    """
+
+    def __init__(self):
+        self._boot = secrets.token_hex(4)
+        self._global = 0
+        self._resources: dict[str, int] = {}
+        self._devices: dict[str, int] = {}
+        self.counters = {"bumps": 0, "not_modified": 0, "modified": 0}
+
+    def bump(self, *resources: str, macs=()):
+        """Record a committed change to `resources` and/or specific devices."""
+        self._global += 1
+        for resource in resources:
+            self._resources[resource] = self._global
+        for mac in macs:
+            self._devices[mac.lower()] = self._global
+        self.counters["bumps"] += 1
+
+    def etag(self, *resources: str, mac: str | None = None, user: str | None = None) -> str:
+        parts = [self._boot, *(str(self._resources.get(r, 0)) for r in resources)]
+        if mac is not None:
+            parts.append(str(self._devices.get(mac.lower(), 0)))
+        if user is not None:
+            # Rendered pages show the logged-in user
+            parts.append(hashlib.blake2b(user.encode(), digest_size=4).hexdigest())
+        return '"' + ".".join(parts) + '"'
+
+    def not_modified(self, request: Request, etag: str) -> Response | None:
+        """A 304 response if the client already has `etag`, else None."""
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            self.counters["not_modified"] += 1
+            return Response(status_code=304, headers=cache_headers(etag))
+        self.counters["modified"] += 1
+        return None
+
+    def stats(self) -> dict:
+        return {**self.counters, "version": self._global, "devices": len(self._devices)}
+
+
+def cache_headers(etag: str) -> dict:
+    # Cacheable, but always revalidated
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+changes = ChangeCounters()
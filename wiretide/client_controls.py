@@ -0,0 +1,145 @@
+# wiretide/client_controls.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import aiosqlite
+
+from wiretide.db import pool
+
+TTL_SECONDS = int(os.getenv("WIRETIDE_CLIENT_CONTROLS_TTL", "300"))
+
+
+class ClientControlIndex:
+    """In-memory view of client_controls (which client MACs are blocked where).
+
+    Loaded with a single query; `set_block()` writes through and updates the
+    index in the same writer transaction. The TTL reload picks up edits made
+    outside this process.
+    """
+
+    def __init__(self, ttl: int = TTL_SECONDS):
+        self.ttl = ttl
+        # router_mac -> set of blocked client MACs
+        self._by_router: dict[str, set[str]] = {}
+        # client_mac -> number of routers blocking it
+        self._blocked: dict[str, int] = {}
+        self._expires = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self.counters = {"loads": 0, "lookups": 0, "updates": 0}
+
+    async def _ensure_loaded(self):
+        if self._expires > time.monotonic():
+            return
+        async with self._lock:
+            if self._expires > time.monotonic():
+                return
+            while True:
+                version = self._version
+                async with pool.reader() as db:
+                    cur = await db.execute(
+                        "SELECT router_mac, client_mac FROM client_controls WHERE block_internet = 1"
+                    )
+                    rows = await cur.fetchall()
+                # A set_block() committed mid-load may be missing from rows
+                if version == self._version:
+                    break
+            by_router, blocked = {}, {}
+            for router_mac, client_mac in rows:
+                by_router.setdefault(router_mac, set()).add(client_mac)
+                blocked[client_mac] = blocked.get(client_mac, 0) + 1
+            self._by_router, self._blocked = by_router, blocked
+            self._expires = time.monotonic() + self.ttl
+            self.counters["loads"] += 1
+
+    async def blocked_clients(self) -> frozenset:
+        """All client MACs blocked on at least one router."""
+        await self._ensure_loaded()
+        self.counters["lookups"] += 1
+        return frozenset(self._blocked)
+
+    async def is_blocked(self, client_mac: str) -> bool:
+        await self._ensure_loaded()
+        self.counters["lookups"] += 1
+        return client_mac.lower() in self._blocked
+
+    async def blocked_for(self, router_mac: str) -> list[str]:
+        await self._ensure_loaded()
+        return sorted(self._by_router.get(router_mac.lower(), ()))
+
+    def _apply(self, router_mac: str, client_mac: str, enabled: bool):
+        macs = self._by_router.setdefault(router_mac, set())
+        if enabled and client_mac not in macs:
+            macs.add(client_mac)
+            self._blocked[client_mac] = self._blocked.get(client_mac, 0) + 1
+        elif not enabled and client_mac in macs:
+            macs.discard(client_mac)
+            if self._blocked.get(client_mac, 0) <= 1:
+                self._blocked.pop(client_mac, None)
+            else:
+                self._blocked[client_mac] -= 1
+        if not macs:
+            del self._by_router[router_mac]
+
+    async def set_block(self, db: aiosqlite.Connection, router_mac: str, client_mac: str,
+                        enabled: bool) -> dict:
+        """Store a block flag plus the router's rebuilt config package.
+
+        Must be called inside `pool.writer()`; commits and returns the package.
+        """
+        await self._ensure_loaded()
+        await db.execute("""
+            INSERT INTO client_controls (router_mac, client_mac, block_internet)
+            VALUES (?, ?, ?)
+            ON CONFLICT(router_mac, client_mac) DO UPDATE SET block_internet=excluded.block_internet
+        """, (router_mac, client_mac, int(enabled)))
+
+        blocked = set(self._by_router.get(router_mac, ()))
+        if enabled:
+            blocked.add(client_mac)
+        else:
+            blocked.discard(client_mac)
+        package = build_package(blocked)
+        await store_package(db, router_mac, package)
+        await db.commit()
+
+        self._version += 1
+        self._apply(router_mac, client_mac, enabled)
+        self.counters["updates"] += 1
+        return package
+
+    def invalidate(self):
+        self._expires = 0.0
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "routers": len(self._by_router),
+            "blocked_clients": len(self._blocked),
+        }
+
+
+def build_package(blocked_macs) -> dict:
+    """Config package for a router from its set of blocked client MACs."""
+    return {
+        "client_controls": [{"mac": mac, "block_internet": True} for mac in sorted(blocked_macs)]
+    }
+
+
+async def store_package(db: aiosqlite.Connection, router_mac: str, package: dict):
+    sha = hashlib.sha256(
+        json.dumps(package, sort_keys=True, separators=(',', ':')).encode()
+    ).hexdigest()
+    blob = json.dumps({"package": package, "sha256": sha})
+    await db.execute("""
+        INSERT INTO device_configs (mac, config, created_at)
+        VALUES (?, ?, ?)
+        ON CONFLICT(mac) DO UPDATE SET config=excluded.config, created_at=excluded.created_at
+    """, (router_mac, blob, datetime.now()))
+
+
+client_controls = ClientControlIndex()
@@ -0,0 +1,144 @@
+# wiretide/compression.py
+import json
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd bodies are optional
+    zstandard = None
+
+# Paths whose request bodies may be compressed (agent uploads)
+DECOMPRESS_PATHS = ("/status", "/sync", "/register", "/clients/chunk")
+# Hard caps against zip bombs / oversized uploads
+MAX_DECOMPRESSED = int(os.getenv("WIRETIDE_MAX_BODY_BYTES", str(4 * 1024 * 1024)))
+MAX_COMPRESSED = int(os.getenv("WIRETIDE_MAX_COMPRESSED_BYTES", str(1024 * 1024)))
+# zstd output per call is not bounded, so feed it small input slices
+_ZSTD_SLICE = 64
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class _GzipStream:
+    def __init__(self, limit: int):
+        self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._budget = limit
+
+    def feed(self, data: bytes) -> bytes:
+        out = []
+        while data:
+            piece = self._d.decompress(data, self._budget + 1)
+            self._budget -= len(piece)
+            if self._budget < 0:
+                raise BodyTooLarge()
+            out.append(piece)
+            data = self._d.unconsumed_tail
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        if not self._d.eof:
+            raise zlib.error("truncated gzip stream")
+        return b""
+
+
+class _ZstdStream:
+    def __init__(self, limit: int):
+        self._d = zstandard.ZstdDecompressor().decompressobj()
+        self._budget = limit
+
+    def feed(self, data: bytes) -> bytes:
+        out = []
+        for i in range(0, len(data), _ZSTD_SLICE):
+            piece = self._d.decompress(data[i:i + _ZSTD_SLICE])
+            self._budget -= len(piece)
+            if self._budget < 0:
+                raise BodyTooLarge()
+            out.append(piece)
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+def _decoder(encoding: str, limit: int):
+    if encoding in ("gzip", "x-gzip"):
+        return _GzipStream(limit)
+    if encoding == "zstd" and zstandard is not None:
+        return _ZstdStream(limit)
+    return None
+
+
+class RequestDecompressionMiddleware:
+    """Inflate `Content-Encoding: gzip` (or zstd) request bodies for agent uploads.
+
+    The body is decompressed incrementally as it arrives, with hard caps on
+    both the compressed and decompressed size; the app then sees a plain body
+    without Content-Encoding.
+    """
+
+    def __init__(self, app, paths=DECOMPRESS_PATHS, max_size: int = MAX_DECOMPRESSED,
+                 max_compressed: int = MAX_COMPRESSED):
+        self.app = app
+        self.paths = set(paths)
+        self.max_size = max_size
+        self.max_compressed = max_compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1").strip().lower()
+        if not encoding or encoding == "identity":
+            return await self.app(scope, receive, send)
+
+        decoder = _decoder(encoding, self.max_size)
+        if decoder is None:
+            return await _error(send, 415, f"unsupported content-encoding: {encoding}")
+
+        chunks, received = [], 0
+        try:
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body = message.get("body", b"")
+                received += len(body)
+                if received > self.max_compressed:
+                    raise BodyTooLarge()
+                chunks.append(decoder.feed(body))
+                if not message.get("more_body", False):
+                    break
+            chunks.append(decoder.finish())
+        except BodyTooLarge:
+            return await _error(send, 413, "request body too large")
+        except Exception as e:
+            return await _error(send, 400, f"invalid {encoding} body: {e}")
+
+        data = b"".join(chunks)
+        scope = dict(scope)
+        scope["headers"] = [
+            (k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(data)).encode())]
+
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": data, "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
+
+
+async def _error(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,100 @@
+# wiretide/config_cache.py
+import json
+import os
+import time
+
+from wiretide.db import pool
+from wiretide.notify import config_notifier
+
+TTL_SECONDS = int(os.getenv("WIRETIDE_CONFIG_CACHE_TTL", "300"))
+
+EMPTY_CONFIG = {"package": {}, "available": False, "sha256": None}
+# Revision for devices with nothing queued, so they get 304s as well
+EMPTY_REVISION = "empty"
+
+
+def make_etag(revision: str | None) -> str | None:
+    return f'"{revision}"' if revision else None
+
+
+def etag_matches(if_none_match: str | None, etag: str | None) -> bool:
+    """True if an If-None-Match header value covers the given ETag."""
+    if not if_none_match or not etag:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+class DeviceConfigCache:
+    """Per-MAC cache of what GET /config returns (approval flag + config body).
+
+    Handlers that change device_configs or a device's approval state call
+    `invalidate(mac)`; the TTL covers edits made outside this process.
+    """
+
+    def __init__(self, ttl: int = TTL_SECONDS):
+        self.ttl = ttl
+        # mac -> (expires_at, entry)
+        self._entries: dict[str, tuple[float, dict]] = {}
+        self.counters = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    @staticmethod
+    def _build(approved, raw_config) -> dict:
+        body = dict(EMPTY_CONFIG)
+        if raw_config:
+            try:
+                cfg = json.loads(raw_config) if isinstance(raw_config, str) else raw_config
+                if isinstance(cfg, dict):
+                    body = {
+                        "package": cfg.get("package", {}),
+                        "available": True,
+                        "sha256": cfg.get("sha256"),
+                    }
+            except Exception:
+                pass
+        revision = body["sha256"] if body["available"] else EMPTY_REVISION
+        body["revision"] = revision
+        return {"approved": bool(approved), "body": body, "etag": make_etag(revision)}
+
+    async def get(self, mac: str) -> dict | None:
+        """Return the cached entry for a MAC, or None if the device is unknown."""
+        now = time.monotonic()
+        cached = self._entries.get(mac)
+        if cached and cached[0] > now:
+            self.counters["hits"] += 1
+            return cached[1]
+
+        self.counters["misses"] += 1
+        async with pool.reader() as db:
+            cursor = await db.execute("""
+                SELECT d.approved, c.config
+                FROM devices d
+                LEFT JOIN device_configs c ON c.mac = d.mac
+                WHERE d.mac = ?
+            """, (mac,))
+            row = await cursor.fetchone()
+        if not row:
+            self._entries.pop(mac, None)
+            return None
+        entry = self._build(row[0], row[1])
+        self._entries[mac] = (now + self.ttl, entry)
+        return entry
+
+    def invalidate(self, mac: str | None = None):
+        if mac is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(mac.lower(), None)
+        # Agents parked on /config/wait re-check their revision
+        config_notifier.notify(mac)
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._entries)}
+
+
+config_cache = DeviceConfigCache()
@@ -1,10 +1,144 @@
-import aiosqlite
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
+
+import aiosqlite
 
 # Single source of truth for DB location
 DB_PATH = os.getenv("WIRETIDE_DB_PATH", "/opt/wiretide/wiretide.db")
 
+# Pool sizing / SQLite tuning
+READER_COUNT = int(os.getenv("WIRETIDE_DB_READERS", "4"))
+BUSY_TIMEOUT_MS = int(os.getenv("WIRETIDE_DB_BUSY_TIMEOUT_MS", "5000"))
+MMAP_SIZE = int(os.getenv("WIRETIDE_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+CACHE_SIZE_KB = int(os.getenv("WIRETIDE_DB_CACHE_KB", "16384"))
+
+PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA mmap_size = {MMAP_SIZE}",
+    f"PRAGMA cache_size = -{CACHE_SIZE_KB}",
+    "PRAGMA temp_store = MEMORY",
+)
+
+logger = logging.getLogger("wiretide")
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: a pool of readers and one serialized writer.
+
+    Connections are opened once (lifespan startup, or lazily on first use) with
+    WAL and the tuned PRAGMAs above, so handlers never pay connection setup.
+    """
+
+    def __init__(self, path: str = DB_PATH, readers: int = READER_COUNT):
+        self.path = path
+        self.reader_count = max(1, readers)
+        self._readers: asyncio.Queue | None = None
+        self._all_readers: list[aiosqlite.Connection] = []
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        for pragma in PRAGMAS:
+            await (await conn.execute(pragma)).close()
+        return conn
+
+    async def open(self):
+        async with self._open_lock:
+            if self.is_open:
+                return
+            writer = await self._connect()
+            # journal_mode is persistent; setting it on the writer is enough
+            await (await writer.execute("PRAGMA journal_mode = WAL")).close()
+            readers = asyncio.Queue()
+            for _ in range(self.reader_count):
+                conn = await self._connect()
+                await (await conn.execute("PRAGMA query_only = 1")).close()
+                self._all_readers.append(conn)
+                readers.put_nowait(conn)
+            self._readers = readers
+            self._writer = writer
+            logger.info("DB pool opened: %s (%d readers + 1 writer)", self.path, self.reader_count)
+
+    async def close(self):
+        async with self._open_lock:
+            if not self.is_open:
+                return
+            async with self._write_lock:
+                try:
+                    await self._writer.execute("PRAGMA optimize")
+                except Exception:
+                    pass
+                await self._writer.close()
+                self._writer = None
+            for conn in self._all_readers:
+                await conn.close()
+            self._all_readers = []
+            self._readers = None
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a read connection (use with 'async with')."""
+        if not self.is_open:
+            await self.open()
+        readers = self._readers
+        conn = await readers.get()
+        try:
+            yield conn
+        finally:
+            conn.row_factory = None
+            readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Exclusive access to the single writer connection.
+
+        Work left open is committed on exit, or rolled back if the block raises.
+        """
+        if not self.is_open:
+            await self.open()
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                if conn.in_transaction:
+                    await conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    await conn.rollback()
+                raise
+            finally:
+                conn.row_factory = None
+
+    async def checkpoint(self):
+        """Fold the WAL back into the main DB file (before copying it)."""
+        async with self.writer() as db:
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+pool = ConnectionPool()
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    """[lo, hi) bounds so `col >= lo AND col < hi` matches a prefix via the index.
+
+    Raises ValueError for an empty prefix (it matches everything; leave the
+    condition out instead).
+    """
+    if not prefix:
+        raise ValueError("empty prefix")
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
 
 async def get_db():
-    """Return an aiosqlite connection (use with 'async with')."""
-    return await aiosqlite.connect(DB_PATH)
+    """FastAPI dependency yielding a pooled read connection."""
+    async with pool.reader() as db:
+        yield db
@@ -0,0 +1,81 @@
+# wiretide/delta.py
+import json
+import os
+import secrets
+from collections import OrderedDict
+
+# Last full status payload kept per device (LRU beyond this)
+MAX_DEVICES = int(os.getenv("WIRETIDE_STATUS_STATE_MAX", "50000"))
+# ... and at most this many payload bytes in total (large client lists add up)
+MAX_BYTES = int(os.getenv("WIRETIDE_STATUS_STATE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+
+def merge_patch(target, patch):
+    """Apply an RFC 7396 JSON merge patch; returns a new value."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+class StatusStateStore:
+    """Last full status payload per MAC, so agents can send merge patches.
+
+    Every accepted report gets a new revision; an agent that sends a patch
+    names the revision it diffed against (X-Status-Base). Unknown or stale
+    bases - including everything after a controller restart - mean the agent
+    has to resend the full payload.
+
+    Payloads are kept as JSON bytes (patched ones re-encoded compactly), so
+    the store is bounded both by device count and by total size.
+    """
+
+    def __init__(self, max_devices: int = MAX_DEVICES, max_bytes: int = MAX_BYTES):
+        self.max_devices = max_devices
+        self.max_bytes = max_bytes
+        self._boot = secrets.token_hex(4)
+        self._seq = 0
+        # mac -> (revision, payload as JSON bytes)
+        self._states: OrderedDict[str, tuple[str, bytes]] = OrderedDict()
+        self._bytes = 0
+        self.counters = {"full": 0, "patched": 0, "resync": 0, "evicted": 0}
+
+    def patch(self, mac: str, base: str, patch) -> dict | None:
+        """Full payload for a patch against `base`, or None if a resync is needed."""
+        state = self._states.get(mac)
+        if not state or state[0] != base or not isinstance(patch, dict):
+            self.counters["resync"] += 1
+            return None
+        self.counters["patched"] += 1
+        return merge_patch(json.loads(state[1]), patch)
+
+    def store(self, mac: str, payload: dict | bytes, patched: bool = False) -> str:
+        """Remember the payload as the device's latest state; returns its revision."""
+        if not patched:
+            self.counters["full"] += 1
+        self._seq += 1
+        revision = f"{self._boot}.{self._seq}"
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload, separators=(",", ":")).encode()
+        old = self._states.pop(mac, None)
+        if old:
+            self._bytes -= len(old[1])
+        self._states[mac] = (revision, payload)
+        self._bytes += len(payload)
+        # A payload larger than max_bytes evicts itself too; that device then always resyncs
+        while self._states and (len(self._states) > self.max_devices or self._bytes > self.max_bytes):
+            _, (_, evicted) = self._states.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.counters["evicted"] += 1
+        return revision
+
+    def stats(self) -> dict:
+        return {**self.counters, "devices": len(self._states), "bytes": self._bytes}
+
+
+status_states = StatusStateStore()
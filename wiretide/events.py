@@ -0,0 +1,97 @@
+# wiretide/events.py
+import asyncio
+import json
+import os
+
+# Events buffered per subscriber before it is considered too slow
+BUFFER_SIZE = int(os.getenv("WIRETIDE_EVENTS_BUFFER", "256"))
+MAX_SUBSCRIBERS = int(os.getenv("WIRETIDE_EVENTS_MAX_SUBSCRIBERS", "200"))
+
+DEVICES = "devices"
+CLIENTS = "clients"
+TOPICS = (DEVICES, CLIENTS)
+
+
+def _frame(seq: int, kind: str, data: str) -> bytes:
+    return f"id: {seq}\nevent: {kind}\ndata: {data}\n\n".encode()
+
+
+class Subscriber:
+    __slots__ = ("queue", "topics")
+
+    def __init__(self, topics, size: int):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=size)
+        self.topics = frozenset(topics)
+
+
+class EventHub:
+    """In-process pub/sub feeding the dashboard's Server-Sent Events stream.
+
+    `publish()` never blocks: each event is encoded once and offered to every
+    subscriber's bounded queue. A subscriber whose queue is full loses its
+    backlog and gets a single "resync" event instead, so a stalled browser
+    costs at most BUFFER_SIZE frames and never holds up ingest.
+    """
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE, max_subscribers: int = MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: set[Subscriber] = set()
+        self._seq = 0
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0, "resyncs": 0, "rejected": 0}
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def publish(self, topic: str, kind: str, data: dict):
+        self._seq += 1
+        self.counters["published"] += 1
+        targets = [sub for sub in self._subscribers if topic in sub.topics]
+        if not targets:
+            return
+        frame = _frame(self._seq, kind, json.dumps(data, separators=(",", ":")))
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(frame)
+                self.counters["delivered"] += 1
+            except asyncio.QueueFull:
+                self._overflow(sub)
+
+    def _overflow(self, sub: Subscriber):
+        dropped = sub.queue.qsize()
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(_frame(self._seq, "resync", "{}"))
+        self.counters["dropped"] += dropped
+        self.counters["resyncs"] += 1
+
+    def subscribe(self, topics=TOPICS) -> Subscriber | None:
+        """Register a subscriber, or None when the hub is at capacity."""
+        if self.full:
+            self.counters["rejected"] += 1
+            return None
+        sub = Subscriber(topics, self.buffer_size)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self._subscribers.discard(sub)
+
+    def resync_frame(self) -> bytes:
+        return _frame(self._seq, "resync", "{}")
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "subscribers": len(self._subscribers),
+            "buffered": sum(s.queue.qsize() for s in self._subscribers),
+            "last_id": self._seq,
+        }
+
+
+event_hub = EventHub()
@@ -0,0 +1,185 @@
+# wiretide/history.py
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+import aiosqlite
+
+from wiretide.db import pool
+
+logger = logging.getLogger("wiretide")
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# How long each resolution is kept (env overrides, in days)
+RETENTION = {
+    MINUTE: int(float(os.getenv("WIRETIDE_HISTORY_RAW_DAYS", "1")) * DAY),
+    HOUR: int(float(os.getenv("WIRETIDE_HISTORY_HOURLY_DAYS", "30")) * DAY),
+    DAY: int(float(os.getenv("WIRETIDE_HISTORY_DAILY_DAYS", "400")) * DAY),
+}
+PRUNE_INTERVAL = int(os.getenv("WIRETIDE_HISTORY_PRUNE_INTERVAL", "3600"))
+
+# Sums instead of averages so every rollup level stays exact
+UPSERT_BUCKET = """
+    INSERT INTO status_history (
+        mac, resolution, bucket, samples, client_sum, client_max, ntp_ok,
+        wan_ip, firewall_profile, wan_ip_changes, profile_changes
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(mac, resolution, bucket) DO UPDATE SET
+        samples = samples + excluded.samples,
+        client_sum = client_sum + excluded.client_sum,
+        client_max = MAX(client_max, excluded.client_max),
+        ntp_ok = ntp_ok + excluded.ntp_ok,
+        wan_ip = excluded.wan_ip,
+        firewall_profile = excluded.firewall_profile,
+        wan_ip_changes = wan_ip_changes + excluded.wan_ip_changes,
+        profile_changes = profile_changes + excluded.profile_changes
+"""
+
+
+def _epoch(ts) -> int:
+    try:
+        return int(datetime.fromisoformat(str(ts)).timestamp())
+    except (TypeError, ValueError):
+        return int(time.time())
+
+
+class StatusHistory:
+    """Append-only per-device status history at 1-minute, 1-hour and 1-day resolution.
+
+    The ingest writer hands over each batch; reports are folded into their
+    minute/hour/day buckets in memory and written as one upsert per bucket,
+    so the rollups are always current and no separate rollup pass is needed.
+    A background task drops buckets older than their resolution's retention.
+    """
+
+    def __init__(self, prune_interval: int = PRUNE_INTERVAL):
+        self.prune_interval = prune_interval
+        # mac -> (wan_ip, firewall_profile) of the last report, for change counts
+        self._last: dict[str, tuple] = {}
+        self._task: asyncio.Task | None = None
+        self.counters = {"reports": 0, "bucket_writes": 0, "pruned": 0}
+
+    # --- Lifecycle ---
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._prune_loop(), name="wiretide-history-prune")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- Write side (called by the ingest writer inside its transaction) ---
+    async def record(self, db: aiosqlite.Connection, reports: list[dict]):
+        buckets: dict[tuple, list] = {}
+        for report in reports:
+            mac = report["mac"]
+            ts = _epoch(report["updated_at"])
+            wan_ip = report.get("wan_ip")
+            profile = report.get("firewall_profile_active")
+            clients = report.get("client_count")
+            if clients is None:
+                clients = len(report.get("clients") or ())
+            prev = self._last.get(mac)
+            wan_changed = int(prev is not None and prev[0] != wan_ip)
+            profile_changed = int(prev is not None and prev[1] != profile)
+            self._last[mac] = (wan_ip, profile)
+
+            for resolution in RESOLUTIONS:
+                key = (mac, resolution, ts - ts % resolution)
+                row = buckets.get(key)
+                if row is None:
+                    buckets[key] = [*key, 1, clients, clients, int(report.get("ntp_synced") or 0),
+                                    wan_ip, profile, wan_changed, profile_changed]
+                else:
+                    row[3] += 1
+                    row[4] += clients
+                    row[5] = max(row[5], clients)
+                    row[6] += int(report.get("ntp_synced") or 0)
+                    row[7], row[8] = wan_ip, profile
+                    row[9] += wan_changed
+                    row[10] += profile_changed
+
+        if buckets:
+            await db.executemany(UPSERT_BUCKET, list(buckets.values()))
+        self.counters["reports"] += len(reports)
+        self.counters["bucket_writes"] += len(buckets)
+
+    def reset(self):
+        """Forget change-tracking state (after a rolled-back batch)."""
+        self._last.clear()
+
+    # --- Retention ---
+    async def prune(self) -> int:
+        now = int(time.time())
+        removed = 0
+        async with pool.writer() as db:
+            for resolution, keep in RETENTION.items():
+                cur = await db.execute(
+                    "DELETE FROM status_history WHERE resolution = ? AND bucket < ?",
+                    (resolution, now - keep),
+                )
+                removed += cur.rowcount
+            await db.commit()
+        self.counters["pruned"] += removed
+        return removed
+
+    async def _prune_loop(self):
+        while True:
+            try:
+                removed = await self.prune()
+                if removed:
+                    logger.info("Status history: pruned %d expired buckets", removed)
+            except Exception as e:
+                logger.warning("Status history prune failed: %s", e)
+            await asyncio.sleep(self.prune_interval)
+
+    # --- Read side ---
+    @staticmethod
+    def pick_resolution(start: int, end: int, max_points: int = 1000) -> int:
+        """Finest resolution that still covers `start` and stays under max_points."""
+        now = int(time.time())
+        for resolution in RESOLUTIONS:
+            if start >= now - RETENTION[resolution] and (end - start) / resolution <= max_points:
+                return resolution
+        return DAY
+
+    async def query(self, mac: str, start: int, end: int, resolution: int) -> list[dict]:
+        async with pool.reader() as db:
+            cursor = await db.execute("""
+                SELECT bucket, samples, client_sum, client_max, ntp_ok,
+                       wan_ip, firewall_profile, wan_ip_changes, profile_changes
+                FROM status_history
+                WHERE mac = ? AND resolution = ? AND bucket >= ? AND bucket < ?
+                ORDER BY bucket
+            """, (mac, resolution, start - start % resolution, end))
+            rows = await cursor.fetchall()
+        return [
+            {
+                "ts": bucket,
+                "samples": samples,
+                "clients_avg": round(client_sum / samples, 2) if samples else None,
+                "clients_max": client_max,
+                "ntp_synced_ratio": round(ntp_ok / samples, 3) if samples else None,
+                "wan_ip": wan_ip,
+                "firewall_profile": firewall_profile,
+                "wan_ip_changes": wan_ip_changes,
+                "profile_changes": profile_changes,
+            }
+            for bucket, samples, client_sum, client_max, ntp_ok,
+                wan_ip, firewall_profile, wan_ip_changes, profile_changes in rows
+        ]
+
+    def stats(self) -> dict:
+        return {**self.counters, "devices": len(self._last)}
+
+
+status_history = StatusHistory()
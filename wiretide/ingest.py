@@ -0,0 +1,302 @@
+# wiretide/ingest.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+import aiosqlite
+from wiretide.db import pool
+from wiretide.inventory import client_inventory
+from wiretide.history import status_history
+from wiretide.secevents import security_events
+from wiretide.secstats import security_stats
+from wiretide.liveness import liveness
+from wiretide.changes import changes, DEVICES, CLIENTS
+from wiretide.events import event_hub
+from wiretide.logging import no_log_context
+
+logger = logging.getLogger("wiretide")
+
+# Tunables (env overrides for larger fleets)
+QUEUE_SIZE = int(os.getenv("WIRETIDE_INGEST_QUEUE_SIZE", "10000"))
+BATCH_SIZE = int(os.getenv("WIRETIDE_INGEST_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("WIRETIDE_INGEST_FLUSH_INTERVAL", "1.0"))
+RETRY_AFTER = int(os.getenv("WIRETIDE_INGEST_RETRY_AFTER", "5"))
+# Identical reports only touch last_seen, but get fully written at least this often
+DEDUPE_MAX_AGE = float(os.getenv("WIRETIDE_DEDUPE_MAX_AGE", "600"))
+LAST_SEEN_FLUSH_INTERVAL = float(os.getenv("WIRETIDE_LAST_SEEN_FLUSH_INTERVAL", "30"))
+WRITE_ATTEMPTS = 3
+
+_STOP = object()
+
+UPSERT_STATUS = """
+    INSERT INTO device_status (
+        mac, model, wan_ip, dns_servers, ntp_synced, firewall_state,
+        firewall_profile_active, security_log_samples, updated_at
+    ) VALUES (
+        :mac, :model, :wan_ip, :dns_servers, :ntp_synced, :firewall_state,
+        :firewall_profile_active, :security_log_samples, :updated_at
+    )
+    ON CONFLICT(mac) DO UPDATE SET
+        model=excluded.model,
+        wan_ip=excluded.wan_ip,
+        dns_servers=excluded.dns_servers,
+        ntp_synced=excluded.ntp_synced,
+        firewall_state=excluded.firewall_state,
+        firewall_profile_active=excluded.firewall_profile_active,
+        security_log_samples=excluded.security_log_samples,
+        updated_at=MAX(COALESCE(updated_at, ''), excluded.updated_at)
+"""
+
+# A batch may land after a last_seen touch of a later, identical report, so
+# timestamps only move forward (all are UTC ISO strings, which sort by time)
+UPDATE_DEVICE = """
+    UPDATE devices SET
+        last_seen = MAX(COALESCE(last_seen, ''), :updated_at),
+        ssh_enabled = :ssh_enabled
+    WHERE mac = :mac
+"""
+
+
+def fingerprint(report: dict) -> bytes:
+    """Digest of a normalized report, ignoring its timestamp."""
+    body = {k: v for k, v in report.items() if k != "updated_at"}
+    return hashlib.blake2b(
+        json.dumps(body, sort_keys=True, separators=(",", ":")).encode(), digest_size=16
+    ).digest()
+
+
+def _history_sample(report: dict) -> dict:
+    return {
+        "mac": report["mac"],
+        "wan_ip": report["wan_ip"],
+        "firewall_profile_active": report["firewall_profile_active"],
+        "ntp_synced": report["ntp_synced"],
+        # None for a chunked router not loaded yet; counted in the table when written
+        "client_count": (len(report["clients"]) if report["clients"] is not None
+                         else client_inventory.count(report["mac"])),
+    }
+
+
+class IngestQueueFull(Exception):
+    """Raised when a status report cannot be queued (backpressure)."""
+
+
+class StatusIngestor:
+    """Write-behind queue for agent status reports.
+
+    Handlers validate and `submit()` a report; a single writer task drains
+    the queue and applies up to BATCH_SIZE reports per transaction.
+
+    A report identical to the device's previous one (same fingerprint) is not
+    queued: it only records an in-memory last_seen, and a flusher writes those
+    in one batched UPDATE every LAST_SEEN_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, dedupe_max_age: float = DEDUPE_MAX_AGE,
+                 last_seen_interval: float = LAST_SEEN_FLUSH_INTERVAL):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedupe_max_age = dedupe_max_age
+        self.last_seen_interval = last_seen_interval
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._touch_task: asyncio.Task | None = None
+        self._closed = False
+        # mac -> (fingerprint, monotonic time queued, history sample)
+        self._fingerprints: dict[str, tuple[bytes, float, dict]] = {}
+        # mac -> newest updated_at of deduplicated reports not yet on disk
+        self._touched: dict[str, str] = {}
+        self._touch_samples: list[dict] = []
+        self.counters = {"accepted": 0, "rejected": 0, "written": 0, "batches": 0, "dropped": 0,
+                         "deduped": 0, "touch_flushes": 0}
+
+    # --- Lifecycle ---
+    async def start(self):
+        self._closed = False
+        self._ensure_started()
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop accepting reports and flush everything still queued."""
+        self._closed = True
+        if self._touch_task:
+            self._touch_task.cancel()
+            try:
+                await self._touch_task
+            except asyncio.CancelledError:
+                pass
+            self._touch_task = None
+        if self._task:
+            await self._queue.put(_STOP)
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                logger.error("Ingest writer did not finish within %ss; %d reports lost",
+                             timeout, self._queue.qsize())
+                self._task.cancel()
+            self._task = None
+        # Touches are newer than the reports they deduplicated against: write them last
+        await self.flush_touches()
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # May run from submit(), i.e. inside a request
+        with no_log_context():
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run(), name="wiretide-ingest")
+            if self._touch_task is None or self._touch_task.done():
+                self._touch_task = asyncio.create_task(self._touch_loop(), name="wiretide-last-seen")
+
+    # --- Producer side ---
+    def submit(self, report: dict):
+        """Queue a normalized status report; raises IngestQueueFull when saturated."""
+        if self._closed:
+            raise IngestQueueFull("ingest is shutting down")
+        self._ensure_started()
+        mac = report["mac"]
+        digest = fingerprint(report)
+        now = time.monotonic()
+        known = self._fingerprints.get(mac)
+        if known and known[0] == digest and now - known[1] < self.dedupe_max_age:
+            self._touched[mac] = report["updated_at"]
+            self._touch_samples.append({**known[2], "updated_at": report["updated_at"]})
+            self.counters["deduped"] += 1
+            liveness.seen(mac)
+            return
+        try:
+            self._queue.put_nowait(report)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise IngestQueueFull("ingest queue full")
+        # Only accepted reports count as a sign of life (a 503 does not)
+        liveness.seen(mac)
+        self._fingerprints[mac] = (digest, now, _history_sample(report))
+        # The queued report carries a newer last_seen than any pending touch
+        self._touched.pop(mac, None)
+        self.counters["accepted"] += 1
+
+    def stats(self) -> dict:
+        seen = self.counters["accepted"] + self.counters["deduped"]
+        return {
+            **self.counters,
+            "dedupe_hit_rate": round(self.counters["deduped"] / seen, 3) if seen else 0.0,
+            "pending_touches": len(self._touched),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "capacity": self.queue_size,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+        }
+
+    # --- Writer side ---
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            async with pool.writer() as db:
+                await self._write_batch(db, batch)
+            if stopping:
+                return
+
+    async def _write_batch(self, db: aiosqlite.Connection, batch: list[dict]):
+        # Only the newest report per device matters for the "latest status" tables
+        latest = {}
+        for report in batch:
+            latest[report["mac"]] = report
+        rows = list(latest.values())
+
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                await db.executemany(UPSERT_STATUS, rows)
+                await db.executemany(UPDATE_DEVICE, rows)
+                changed_clients = await client_inventory.apply(db, rows)
+                # Chunked client tables are not in the report; count what we have
+                for report in batch:
+                    if report["clients"] is None:
+                        report["client_count"] = await client_inventory.stored_count(db, report["mac"])
+                # History wants every report, not just the latest per device
+                await status_history.record(db, batch)
+                new_events = await security_events.record(db, batch)
+                await db.commit()
+                break
+            except Exception as e:
+                await db.rollback()
+                client_inventory.reset()
+                status_history.reset()
+                security_events.reset()
+                if attempt == WRITE_ATTEMPTS:
+                    self.counters["dropped"] += len(batch)
+                    # Make sure the next report from these devices is written in full
+                    for report in batch:
+                        self._fingerprints.pop(report["mac"], None)
+                    logger.error("Ingest batch of %d reports dropped: %s", len(batch), e)
+                    return
+                logger.warning("Ingest batch write failed (attempt %d): %s", attempt, e)
+                await asyncio.sleep(0.2 * attempt)
+
+        # Counted only once committed, so a retried batch is not counted twice
+        security_stats.observe(new_events)
+        changes.bump(DEVICES, macs=latest)
+        if changed_clients:
+            changes.bump(CLIENTS, macs=changed_clients)
+            event_hub.publish(CLIENTS, "clients.changed", {"routers": sorted(changed_clients)})
+        self.counters["written"] += len(batch)
+        self.counters["batches"] += 1
+
+    # --- Coalesced last_seen writes for deduplicated reports ---
+    async def _touch_loop(self):
+        while True:
+            await asyncio.sleep(self.last_seen_interval)
+            try:
+                await self.flush_touches()
+            except Exception as e:
+                logger.warning("last_seen flush failed: %s", e)
+
+    async def flush_touches(self):
+        if not self._touched and not self._touch_samples:
+            return
+        async with pool.writer() as db:
+            # Swap under the writer lock so no newer full write can land in between
+            touched, self._touched = self._touched, {}
+            samples, self._touch_samples = self._touch_samples, []
+            rows = [(ts, mac) for mac, ts in touched.items()]
+            try:
+                for sample in samples:
+                    if sample["client_count"] is None:
+                        sample["client_count"] = await client_inventory.stored_count(db, sample["mac"])
+                await db.executemany("UPDATE devices SET last_seen = ? WHERE mac = ?", rows)
+                await db.executemany("UPDATE device_status SET updated_at = ? WHERE mac = ?", rows)
+                await status_history.record(db, samples)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        changes.bump(DEVICES, macs=touched)
+        self.counters["touch_flushes"] += 1
+
+
+ingestor = StatusIngestor()
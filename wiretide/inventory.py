@@ -0,0 +1,241 @@
+# wiretide/inventory.py
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+
+import aiosqlite
+
+from wiretide.db import pool
+from wiretide.changes import changes, CLIENTS
+from wiretide.events import event_hub
+
+# Unchanged clients get their last_seen rewritten at most this often
+TOUCH_SECONDS = int(os.getenv("WIRETIDE_CLIENT_TOUCH_SECONDS", "600"))
+# Upper bound for one router's client table (chunked uploads)
+MAX_CLIENTS_PER_ROUTER = int(os.getenv("WIRETIDE_MAX_CLIENTS_PER_ROUTER", "10000"))
+# Unfinished chunked uploads are dropped after this many seconds
+UPLOAD_TTL = int(os.getenv("WIRETIDE_CLIENT_UPLOAD_TTL", "300"))
+# SQLite host-parameter budget per IN (...) query
+_CHUNK = 500
+
+
+def normalize_clients(raw) -> list[dict]:
+    """Agent client list -> [{"mac", "ip", "hostname"}] with lower-case, unique MACs."""
+    if not isinstance(raw, list):
+        return []
+    seen = {}
+    for c in raw:
+        if not isinstance(c, dict) or not c.get("mac"):
+            continue
+        mac = str(c["mac"]).strip().lower()
+        seen[mac] = {
+            "mac": mac,
+            "ip": str(c["ip"]) if c.get("ip") else None,
+            "hostname": str(c["hostname"]) if c.get("hostname") else None,
+        }
+    return list(seen.values())
+
+
+def _epoch(ts) -> int:
+    try:
+        return int(datetime.fromisoformat(str(ts)).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+# In-memory state is packed: a MAC becomes a 48-bit int key and each client's
+# (ip, hostname) signature plus last write time share one int value.
+def _pack_mac(mac: str):
+    try:
+        return int(mac.replace(":", ""), 16) if len(mac) == 17 else mac
+    except ValueError:
+        return mac
+
+
+def _unpack_mac(key) -> str:
+    if isinstance(key, str):
+        return key
+    raw = f"{key:012x}"
+    return ":".join(raw[i:i + 2] for i in range(0, 12, 2))
+
+
+def _pack(ip, hostname, epoch: int) -> int:
+    sig = zlib.crc32(f"{ip}|{hostname}".encode())
+    return (sig << 32) | (epoch & 0xFFFFFFFF)
+
+
+class ClientInventory:
+    """Keeps the `clients` table in step with what routers report.
+
+    Remembers the last written (ip, hostname) per client so a batch only writes
+    rows that are new or changed (plus a periodic last_seen refresh), and
+    deletes clients a router no longer reports.
+    """
+
+    def __init__(self, touch_seconds: int = TOUCH_SECONDS):
+        self.touch_seconds = touch_seconds
+        # router_mac -> packed client MAC -> packed (signature, last write epoch)
+        self._known: dict[str, dict] = {}
+        self.counters = {"upserts": 0, "deletes": 0, "unchanged": 0}
+
+    async def _load(self, db: aiosqlite.Connection, routers: list[str]):
+        for i in range(0, len(routers), _CHUNK):
+            chunk = routers[i:i + _CHUNK]
+            for router in chunk:
+                self._known[router] = {}
+            marks = ",".join("?" * len(chunk))
+            cursor = await db.execute(
+                f"SELECT router_mac, client_mac, ip, hostname, last_seen FROM clients WHERE router_mac IN ({marks})",
+                chunk,
+            )
+            for router, client, ip, hostname, last_seen in await cursor.fetchall():
+                self._known[router][_pack_mac(client)] = _pack(ip, hostname, _epoch(last_seen))
+
+    async def apply(self, db: aiosqlite.Connection, reports: list[dict]):
+        """Stage client changes for a batch of reports (caller commits).
+
+        Each report needs "mac", "updated_at" and a normalized "clients" list;
+        reports whose clients are None (sent separately in chunks) are skipped.
+        Returns the routers whose client rows were written.
+        """
+        reports = [r for r in reports if r.get("clients") is not None]
+        missing = [r["mac"] for r in reports if r["mac"] not in self._known]
+        if missing:
+            await self._load(db, missing)
+
+        upserts, deletes = [], []
+        changed = set()
+        for report in reports:
+            router = report["mac"]
+            seen_at = report["updated_at"]
+            now = _epoch(seen_at)
+            known = self._known[router]
+            current = {}
+            written = len(upserts)
+            for c in report["clients"]:
+                key = _pack_mac(c["mac"])
+                prev = known.get(key)
+                packed = _pack(c["ip"], c["hostname"], now)
+                if prev is not None and prev >> 32 == packed >> 32 and now - (prev & 0xFFFFFFFF) < self.touch_seconds:
+                    current[key] = prev
+                    self.counters["unchanged"] += 1
+                    continue
+                current[key] = packed
+                upserts.append((router, c["mac"], c["ip"], c["hostname"], seen_at))
+            gone = [(router, _unpack_mac(key)) for key in known if key not in current]
+            deletes.extend(gone)
+            if gone or len(upserts) > written:
+                changed.add(router)
+            self._known[router] = current
+
+        if upserts:
+            await db.executemany("""
+                INSERT INTO clients (router_mac, client_mac, ip, hostname, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(router_mac, client_mac) DO UPDATE SET
+                    ip=excluded.ip, hostname=excluded.hostname, last_seen=excluded.last_seen
+            """, upserts)
+        if deletes:
+            await db.executemany("DELETE FROM clients WHERE router_mac = ? AND client_mac = ?", deletes)
+        self.counters["upserts"] += len(upserts)
+        self.counters["deletes"] += len(deletes)
+        return changed
+
+    async def replace(self, router_mac: str, clients: list[dict]):
+        """Store a router's complete client table (end of a chunked upload)."""
+        seen_at = datetime.now(timezone.utc).isoformat()
+        try:
+            async with pool.writer() as db:
+                changed = await self.apply(db, [{"mac": router_mac, "updated_at": seen_at, "clients": clients}])
+                await db.commit()
+        except Exception:
+            self.reset()
+            raise
+        if changed:
+            changes.bump(CLIENTS, macs=changed)
+            event_hub.publish(CLIENTS, "clients.changed", {"routers": sorted(changed)})
+
+    def count(self, router_mac: str) -> int | None:
+        known = self._known.get(router_mac)
+        return None if known is None else len(known)
+
+    async def stored_count(self, db: aiosqlite.Connection, router_mac: str) -> int:
+        """Client count from memory, or from the table when the router is not loaded yet."""
+        count = self.count(router_mac)
+        if count is None:
+            cursor = await db.execute("SELECT COUNT(*) FROM clients WHERE router_mac = ?", (router_mac,))
+            count = (await cursor.fetchone())[0]
+        return count
+
+    def reset(self):
+        """Forget cached state (after a rolled-back batch); reloaded on demand."""
+        self._known.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "routers": len(self._known),
+            "clients": sum(len(k) for k in self._known.values()),
+        }
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ClientUploads:
+    """Reassembles client tables that agents send in sequential chunks.
+
+    Chunk 0 starts (or restarts) an upload for a router; later chunks must
+    carry the same upload id and the next sequence number. The last chunk
+    returns the complete, de-duplicated client list.
+    """
+
+    def __init__(self, max_clients: int = MAX_CLIENTS_PER_ROUTER, ttl: int = UPLOAD_TTL):
+        self.max_clients = max_clients
+        self.ttl = ttl
+        # router_mac -> {"id", "next", "clients": {mac: client}, "expires"}
+        self._uploads: dict[str, dict] = {}
+        self.counters = {"chunks": 0, "completed": 0, "restarted": 0, "expired": 0, "rejected": 0}
+
+    def add(self, router_mac: str, upload_id: str, seq: int, clients: list[dict], last: bool) -> list[dict] | None:
+        now = time.monotonic()
+        for mac in [m for m, u in self._uploads.items() if u["expires"] < now]:
+            del self._uploads[mac]
+            self.counters["expired"] += 1
+
+        upload = self._uploads.get(router_mac)
+        if seq == 0:
+            if upload:
+                self.counters["restarted"] += 1
+            upload = self._uploads[router_mac] = {"id": upload_id, "next": 0, "clients": {}}
+        elif not upload or upload["id"] != upload_id or upload["next"] != seq:
+            self.counters["rejected"] += 1
+            raise UploadError(409, "unknown upload or out-of-order chunk, restart at seq 0")
+
+        for c in clients:
+            upload["clients"][c["mac"]] = c
+        if len(upload["clients"]) > self.max_clients:
+            del self._uploads[router_mac]
+            self.counters["rejected"] += 1
+            raise UploadError(413, f"more than {self.max_clients} clients")
+        upload["next"] = seq + 1
+        upload["expires"] = now + self.ttl
+        self.counters["chunks"] += 1
+
+        if not last:
+            return None
+        del self._uploads[router_mac]
+        self.counters["completed"] += 1
+        return list(upload["clients"].values())
+
+    def stats(self) -> dict:
+        return {**self.counters, "in_progress": len(self._uploads)}
+
+
+client_inventory = ClientInventory()
+client_uploads = ClientUploads()
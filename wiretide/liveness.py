@@ -0,0 +1,252 @@
+# wiretide/liveness.py
+import asyncio
+import heapq
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from wiretide.db import pool
+from wiretide.changes import changes, DEVICES
+from wiretide.events import event_hub
+
+logger = logging.getLogger("wiretide")
+
+# Agents report every INTERVAL seconds (wiretide-agent-run default: 60)
+AGENT_INTERVAL = float(os.getenv("WIRETIDE_AGENT_INTERVAL", "60"))
+STALE_AFTER = float(os.getenv("WIRETIDE_STALE_AFTER", str(AGENT_INTERVAL * 2.5)))
+OFFLINE_AFTER = float(os.getenv("WIRETIDE_OFFLINE_AFTER", str(AGENT_INTERVAL * 5)))
+# State changes are written to devices.liveness in batches this often
+FLUSH_INTERVAL = float(os.getenv("WIRETIDE_LIVENESS_FLUSH_INTERVAL", "5"))
+
+ONLINE, STALE, OFFLINE, UNKNOWN = "online", "stale", "offline", "unknown"
+STATES = (ONLINE, STALE, OFFLINE, UNKNOWN)
+
+
+def _epoch(ts) -> float | None:
+    """Wall-clock seconds for a stored timestamp (naive values are UTC, as SQLite writes them)."""
+    if not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(ts))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class LivenessTracker:
+    """Online/stale/offline state per device, driven by a deadline heap.
+
+    Each tracked device has at most one heap entry: the time its current
+    state expires. A report only updates the device's last-seen time (O(1));
+    when the entry comes due, the device is either re-armed at its real
+    deadline or moved one state down, so every transition costs O(log n)
+    and nothing scans the fleet. Changes are queued and written to
+    devices.liveness in one batch per flush; per-state counts are kept
+    incrementally.
+    """
+
+    def __init__(self, stale_after: float = STALE_AFTER, offline_after: float = OFFLINE_AFTER,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.stale_after = stale_after
+        self.offline_after = max(offline_after, stale_after)
+        self.flush_interval = flush_interval
+        # mac -> [state, last_seen epoch, generation of its heap entry (0 = none)]
+        self._devices: dict[str, list] = {}
+        self._heap: list[tuple[float, str, int]] = []
+        self._gen = 0
+        self._counts = dict.fromkeys(STATES, 0)
+        # mac -> state not yet written to the devices table
+        self._pending: dict[str, str] = {}
+        self._task: asyncio.Task | None = None
+        self.counters = {"transitions": 0, "writes": 0, "flushes": 0}
+
+    # --- Lifecycle ---
+    async def start(self):
+        await self.load()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="wiretide-liveness")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Liveness flush on shutdown failed: %s", e)
+
+    async def load(self):
+        """Seed states from the last report time of every known device.
+
+        Devices that registered but never reported (no device_status row)
+        are tracked as unknown, so they still show up in counts().
+        """
+        async with pool.reader() as db:
+            cursor = await db.execute("""
+                SELECT d.mac, ds.updated_at, d.liveness
+                FROM devices d
+                LEFT JOIN device_status ds ON ds.mac = d.mac
+                WHERE d.status != 'removed'
+            """)
+            rows = await cursor.fetchall()
+        now = time.time()
+        self._devices.clear()
+        self._heap.clear()
+        self._counts = dict.fromkeys(STATES, 0)
+        changed = False
+        for mac, seen, stored in rows:
+            last = _epoch(seen)
+            state = stored if stored in STATES and last is not None else UNKNOWN
+            self._devices[mac] = [state, last or 0.0, 0]
+            self._counts[state] += 1
+            if last is None:
+                if stored != UNKNOWN:
+                    self._pending[mac] = UNKNOWN
+                continue
+            age = now - last
+            # Restored, not a transition: no per-device event or count
+            changed |= self._apply(mac, ONLINE if age < self.stale_after else STALE if age < self.offline_after else OFFLINE)
+            if self._devices[mac][0] != OFFLINE:
+                self._arm(mac, now)
+        heapq.heapify(self._heap)
+        if changed:
+            changes.bump(DEVICES)
+            event_hub.publish(DEVICES, "resync", {})
+
+    # --- Event side ---
+    def seen(self, mac: str, ts: float | None = None):
+        """A device reported in (called for every accepted report)."""
+        now = time.time() if ts is None else ts
+        entry = self._devices.get(mac)
+        if entry is None:
+            entry = self._devices[mac] = [UNKNOWN, now, 0]
+            self._counts[UNKNOWN] += 1
+        elif now > entry[1]:
+            entry[1] = now
+        if entry[0] != ONLINE:
+            self._set(mac, ONLINE)
+        if not entry[2]:
+            self._arm(mac, now)
+
+    def track(self, mac: str):
+        """Count a newly registered device as unknown until its first report."""
+        if mac not in self._devices:
+            self._devices[mac] = [UNKNOWN, 0.0, 0]
+            self._counts[UNKNOWN] += 1
+
+    def forget(self, mac: str):
+        """Stop tracking a removed device (its heap entry is skipped later)."""
+        entry = self._devices.pop(mac, None)
+        if entry:
+            self._counts[entry[0]] -= 1
+        self._pending.pop(mac, None)
+
+    def _arm(self, mac: str, now: float):
+        entry = self._devices[mac]
+        deadline = entry[1] + (self.stale_after if entry[0] == ONLINE else self.offline_after)
+        self._gen += 1
+        entry[2] = self._gen
+        heapq.heappush(self._heap, (max(deadline, now), mac, self._gen))
+
+    def _apply(self, mac: str, state: str) -> bool:
+        entry = self._devices[mac]
+        if entry[0] == state:
+            return False
+        self._counts[entry[0]] -= 1
+        self._counts[state] += 1
+        entry[0] = state
+        self._pending[mac] = state
+        return True
+
+    def _set(self, mac: str, state: str):
+        if not self._apply(mac, state):
+            return
+        self.counters["transitions"] += 1
+        changes.bump(DEVICES, macs=[mac])
+        event_hub.publish(DEVICES, "device.liveness", {"mac": mac, "state": state})
+
+    def expire(self, now: float | None = None) -> int:
+        """Handle every heap entry that is due; returns the number of transitions."""
+        now = time.time() if now is None else now
+        before = self.counters["transitions"]
+        while self._heap and self._heap[0][0] <= now:
+            _, mac, gen = heapq.heappop(self._heap)
+            entry = self._devices.get(mac)
+            if entry is None or entry[2] != gen:
+                continue
+            entry[2] = 0
+            age = now - entry[1]
+            if age < self.stale_after:
+                self._set(mac, ONLINE)
+            elif age < self.offline_after:
+                self._set(mac, STALE)
+            else:
+                self._set(mac, OFFLINE)
+                continue
+            self._arm(mac, now)
+        return self.counters["transitions"] - before
+
+    # --- Persistence ---
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with pool.writer() as db:
+                await db.executemany(
+                    "UPDATE devices SET liveness = ? WHERE mac = ?",
+                    [(state, mac) for mac, state in pending.items()],
+                )
+                await db.commit()
+        except Exception:
+            # Keep anything that did not change again in the meantime
+            for mac, state in pending.items():
+                self._pending.setdefault(mac, state)
+            raise
+        self.counters["writes"] += len(pending)
+        self.counters["flushes"] += 1
+
+    async def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            delay = self.flush_interval
+            if self._heap:
+                delay = min(delay, max(0.0, self._heap[0][0] - time.time()))
+            await asyncio.sleep(delay)
+            self.expire()
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.warning("Liveness flush failed: %s", e)
+
+    # --- Read side ---
+    def state(self, mac: str) -> str | None:
+        entry = self._devices.get(mac)
+        return entry[0] if entry else None
+
+    def devices_in(self, state: str) -> list[str]:
+        return sorted(mac for mac, entry in self._devices.items() if entry[0] == state)
+
+    def counts(self) -> dict:
+        return dict(self._counts)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            **self._counts,
+            "tracked": len(self._devices),
+            "scheduled": len(self._heap),
+            "pending_writes": len(self._pending),
+        }
+
+
+liveness = LivenessTracker()
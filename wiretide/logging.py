@@ -1,20 +1,175 @@
 # wiretide/logging.py
+import atexit
+import json
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = os.getenv("WIRETIDE_LOG_FILE", "/opt/wiretide/logs/wiretide.log")
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 5
+# "text" (default) or "json" (one object per line)
+LOG_FORMAT = os.getenv("WIRETIDE_LOG_FORMAT", "text").lower()
+# Records waiting for the writer thread; beyond this they are dropped, not awaited
+QUEUE_SIZE = int(os.getenv("WIRETIDE_LOG_QUEUE_SIZE", "10000"))
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Request fields carried on every record logged while handling that request
+CONTEXT_FIELDS = ("request_id", "route", "mac", "status", "latency_ms")
+
+# Per-request dict, shared (not copied) by tasks spawned inside the request
+_context: ContextVar[dict | None] = ContextVar("wiretide_log_context", default=None)
+
+
+def log_context(**fields):
+    """Attach fields (e.g. mac=...) to log records of the current request."""
+    ctx = _context.get()
+    if ctx is not None:
+        ctx.update(fields)
+
+
+@contextmanager
+def no_log_context():
+    """Drop the current request's log context for the block.
+
+    For starting long-lived tasks from inside a request: create_task copies
+    the context, so the task would log with that request's fields forever.
+    """
+    token = _context.set(None)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ts and level come first (see wiretide/logreader.py)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, TS_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind.
+
+    Runs on the logging thread (usually the event loop): it only snapshots the
+    request context and enqueues. Formatting and file I/O, including rotation,
+    happen on the QueueListener thread.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.counters = {"queued": 0, "dropped": 0}
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        ctx = _context.get()
+        if ctx:
+            for field in CONTEXT_FIELDS:
+                if field in ctx:
+                    setattr(record, field, ctx[field])
+        # Resolve args now (they may change after this call); keep the traceback for the formatter
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.counters["queued"] += 1
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": self.queue.qsize(), "capacity": self.queue.maxsize}
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # The writer thread is draining, so wait for room instead of failing on a full queue
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+class RequestContextMiddleware:
+    """Give each HTTP request a log context: request id, route, status and latency.
+
+    The id comes from X-Request-ID when present and is echoed in the response;
+    agent requests also get their X-MAC.
+    Status and latency are filled in at response start, before uvicorn writes
+    its access line, so that line carries them too.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        ctx = {}
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                ctx["request_id"] = value.decode("latin-1")[:64]
+            elif name == b"x-mac":
+                ctx["mac"] = value.decode("latin-1").lower().strip()
+        ctx.setdefault("request_id", uuid.uuid4().hex[:16])
+        _context.set(ctx)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                ctx["route"] = getattr(route, "path", scope.get("path"))
+                ctx["status"] = message["status"]
+                ctx["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", ctx["request_id"].encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
-LOG_FILE = "/opt/wiretide/logs/wiretide.log"
 
 # Ensure log directory exists
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-# Configure rotating log handler (5MB per file, keep 5 backups)
-handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=5)
-formatter = logging.Formatter(
-    "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-handler.setFormatter(formatter)
+# Rotating file handler, driven by the listener thread
+file_handler = RotatingFileHandler(LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+if LOG_FORMAT == "json":
+    file_handler.setFormatter(JsonFormatter())
+else:
+    file_handler.setFormatter(logging.Formatter(
+        "%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt=TS_FORMAT
+    ))
+
+handler = BoundedQueueHandler(queue.Queue(maxsize=QUEUE_SIZE))
+listener = _Listener(handler.queue, file_handler, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
 
 # Root logger setup
 root_logger = logging.getLogger()
@@ -0,0 +1,136 @@
+# wiretide/logreader.py
+import os
+import re
+from datetime import datetime
+
+# Block size for reading backwards from the end of a file
+BLOCK_SIZE = 64 * 1024
+
+# "2025-08-27 12:00:00 [LEVEL] name: message" or, with WIRETIDE_LOG_FORMAT=json,
+# {"ts": "2025-08-27 12:00:00", "level": "LEVEL", ...} (see wiretide/logging.py)
+HEADER_RE = re.compile(rb'^(?:\{"ts": ")?(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?: \[|", "level": ")([A-Z]+)')
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def log_files(path: str, backups: int) -> list[str]:
+    """The live log followed by its rotated copies (.1 newest ... .N oldest)."""
+    return [p for p in [path] + [f"{path}.{i}" for i in range(1, backups + 1)] if os.path.exists(p)]
+
+
+def _header(line: bytes):
+    m = HEADER_RE.match(line)
+    if not m:
+        return None
+    try:
+        return datetime.strptime(m.group(1).decode(), TS_FORMAT), m.group(2).decode()
+    except ValueError:
+        return None
+
+
+def _reverse_lines(f, end: int):
+    """Yield (start offset, line) from `end` back to the start of the file."""
+    pos = end
+    line_end = end
+    pending = b""
+    while pos > 0:
+        size = min(BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        pieces = (f.read(size) + pending).split(b"\n")
+        pending = pieces[0]
+        for line in reversed(pieces[1:]):
+            start = line_end - len(line)
+            if line:
+                yield start, line
+            line_end = start - 1
+    if pending:
+        yield 0, pending
+
+
+def _entries_backwards(f, end: int):
+    """Yield (offset, ts, level, lines) per log entry, newest first.
+
+    Lines without a timestamp header (tracebacks) belong to the entry above them.
+    """
+    continuation = []
+    for start, line in _reverse_lines(f, end):
+        header = _header(line)
+        if header is None:
+            continuation.append(line)
+            continue
+        yield start, header[0], header[1], [line] + continuation[::-1]
+        continuation = []
+
+
+def _next_header(f, pos: int, size: int) -> tuple[int, datetime | None]:
+    """Offset and time of the first entry header starting at or after `pos`."""
+    f.seek(max(pos - 1, 0))
+    if pos:
+        f.readline()  # finish the line that `pos` falls into
+    offset = f.tell()
+    while offset < size:
+        header = _header(f.readline().rstrip(b"\n"))
+        if header:
+            return offset, header[0]
+        offset = f.tell()
+    return size, None
+
+
+def _first_after(f, size: int, until: datetime) -> int:
+    """Offset of the first entry newer than `until` (binary search on timestamps)."""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        ts = _next_header(f, mid, size)[1]
+        if ts is None or ts > until:
+            hi = mid
+        else:
+            lo = mid + 1
+    return min(_next_header(f, lo, size)[0], size)
+
+
+def read_entries(paths: list[str], limit: int, cursor: str | None = None, levels: set | None = None,
+                 since: datetime | None = None, until: datetime | None = None) -> tuple[list[str], str | None]:
+    """Newest-first page of log entries across the live and rotated files.
+
+    Only the bytes behind the returned entries are read (plus one binary search
+    when `until` is given). The cursor is "<inode>:<offset>" of the oldest entry
+    returned, so it keeps pointing at the same file across a rotation.
+    Returns (lines in chronological order, cursor for the next older page).
+    """
+    start_inode, start_offset = None, None
+    if cursor:
+        inode, _, offset = cursor.partition(":")
+        start_inode, start_offset = int(inode), int(offset)
+
+    found = []
+    next_cursor = None
+    started = start_inode is None
+    for path in paths:
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            st = os.fstat(f.fileno())
+            end = st.st_size
+            if not started:
+                if st.st_ino != start_inode:
+                    continue
+                started, end = True, min(start_offset, end)
+            if until is not None:
+                end = min(end, _first_after(f, end, until))
+            for offset, ts, level, lines in _entries_backwards(f, end):
+                if since is not None and ts < since:
+                    return _page(found), None
+                if levels and level not in levels:
+                    continue
+                if len(found) == limit:
+                    return _page(found), next_cursor
+                found.append(lines)
+                next_cursor = f"{st.st_ino}:{offset}"
+    return _page(found), None
+
+
+def _page(found: list[list[bytes]]) -> list[str]:
+    return [line.decode("utf-8", "replace") + "\n" for lines in reversed(found) for line in lines]
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -7,14 +8,38 @@ import os
 from wiretide.api import roles
 from fastapi.responses import FileResponse
 from wiretide.timeutil import format_local
+from wiretide.db import pool
+from wiretide.ingest import ingestor
+from wiretide.history import status_history
+from wiretide.secevents import security_events
+from wiretide.liveness import liveness
+from wiretide.compression import RequestDecompressionMiddleware
 
-app = FastAPI()  # <-- Define app FIRST
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the DB pool and start background workers; flush and close on shutdown."""
+    await pool.open()
+    await ingestor.start()
+    await status_history.start()
+    await security_events.start()
+    await liveness.start()
+    yield
+    await liveness.stop()
+    await security_events.stop()
+    await status_history.stop()
+    await ingestor.stop()
+    await pool.close()
+
+
+app = FastAPI(lifespan=lifespan)  # <-- Define app FIRST
 
 # Directories
-STATIC_DIR = "/opt/wiretide/wiretide/static"
+STATIC_DIR = os.getenv("WIRETIDE_STATIC_DIR", "/opt/wiretide/wiretide/static")
 
 # Initialize logging (rotating file handler)
 import wiretide.logging  # Sets up /var/log/wiretide.log
+from wiretide.logging import RequestContextMiddleware
 
 # Mount static (logo, agent files, CA cert)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -33,6 +58,8 @@ class RedirectUnauthorizedMiddleware(BaseHTTPMiddleware):
         return response
 
 app.add_middleware(RedirectUnauthorizedMiddleware)
+# Agents may gzip/zstd their uploads
+app.add_middleware(RequestDecompressionMiddleware)
 app.add_middleware(
     SessionMiddleware,
     secret_key=os.getenv("WIRETIDE_SESSION_SECRET", "insecure-default"),
@@ -41,9 +68,11 @@ app.add_middleware(
     same_site="lax",
     https_only=True
 )
+# Outermost: request id / route / latency for every log line of a request
+app.add_middleware(RequestContextMiddleware)
 
 # Import routers (after static)
-from wiretide.api import devices, auth, system, backup, logs, settings, clients, ui
+from wiretide.api import devices, auth, system, backup, logs, settings, clients, ui, history, events, export, security
 app.include_router(auth.router)
 app.include_router(ui.router)
 app.include_router(devices.router)
@@ -53,6 +82,10 @@ app.include_router(backup.router)
 app.include_router(logs.router)
 app.include_router(clients.router)
 app.include_router(roles.router)
+app.include_router(history.router)
+app.include_router(events.router)
+app.include_router(export.router)
+app.include_router(security.router)
 
 # Shortcut for CA certificate (agents will wget this directly)
 @app.get("/ca.crt")
@@ -1,10 +1,172 @@
-from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
-
-class DeviceStatus(BaseModel):
-    hostname: str
-    mac: str
-    ssh_fingerprint: Optional[str] = None
-    ssh_enabled: bool = True
-    settings: Optional[Dict[str, Any]] = {}
-    clients: Optional[List[Dict[str, Any]]] = []
+import json
+import os
+from datetime import datetime, timezone
+
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices, field_validator
+from typing import Any, List, Optional
+
+from wiretide.inventory import normalize_clients
+
+# Larger client tables are sent through /clients/chunk
+MAX_INLINE_CLIENTS = int(os.getenv("WIRETIDE_MAX_INLINE_CLIENTS", "500"))
+MAX_SECURITY_SAMPLES = 50
+
+
+def _blank_to_none(v):
+    return None if v == "" else v
+
+
+class StatusFields(BaseModel):
+    """Status values an agent may send, under their current or legacy names.
+
+    Used both for the "settings" object and the top level of the payload;
+    values in "settings" win, like the old pick() lookups.
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    model: Optional[str] = None
+    wan_ip: Optional[str] = None
+    dns: Optional[List[str]] = Field(None, validation_alias=AliasChoices("dns", "dns_servers"))
+    ntp: Optional[bool] = Field(None, validation_alias=AliasChoices("ntp", "ntp_synced"))
+    firewall: Optional[str] = Field(None, validation_alias=AliasChoices("firewall", "firewall_state"))
+    firewall_profile: Optional[str] = Field(
+        None, validation_alias=AliasChoices("firewall_profile", "firewall_profile_active")
+    )
+    security_log_samples: Optional[List[str]] = None
+
+    @field_validator("model", "wan_ip", "firewall", "firewall_profile", mode="before")
+    @classmethod
+    def _as_text(cls, v):
+        v = _blank_to_none(v)
+        return None if v is None else str(v)
+
+    @field_validator("dns", mode="before")
+    @classmethod
+    def _dns(cls, v):
+        v = _blank_to_none(v)
+        if isinstance(v, str):
+            try:
+                maybe = json.loads(v)
+                return [str(x) for x in maybe] if isinstance(maybe, list) else [v]
+            except ValueError:
+                return [x.strip() for x in v.split(",") if x.strip()]
+        if isinstance(v, list):
+            return [str(x) for x in v]
+        return None
+
+    @field_validator("ntp", mode="before")
+    @classmethod
+    def _ntp(cls, v):
+        v = _blank_to_none(v)
+        if isinstance(v, str) and v.strip().lower() in ("true", "false", "1", "0", "yes", "no"):
+            return v
+        return None if v is None else bool(v)
+
+    @field_validator("security_log_samples", mode="before")
+    @classmethod
+    def _samples(cls, v):
+        v = _blank_to_none(v)
+        if isinstance(v, list):
+            return [str(x) for x in v][-MAX_SECURITY_SAMPLES:]
+        if isinstance(v, str):
+            return [ln for ln in v.splitlines() if ln.strip()][-MAX_SECURITY_SAMPLES:]
+        return None
+
+
+class StatusPayload(StatusFields):
+    """Agent status report (/status, /sync) as posted by wiretide-agent-run."""
+
+    mac: str = ""
+    hostname: Optional[str] = None
+    ssh_enabled: bool = False
+    settings: StatusFields = Field(default_factory=StatusFields)
+    clients: List[Any] = Field(default_factory=list)
+    # True when the client table follows in chunks instead of inline
+    clients_chunked: bool = False
+
+    @field_validator("mac", mode="before")
+    @classmethod
+    def _mac(cls, v):
+        return str(v or "").strip().lower()
+
+    @field_validator("hostname", mode="before")
+    @classmethod
+    def _hostname(cls, v):
+        # Agents may send a bare number or a blank; don't reject the report for it
+        v = _blank_to_none(v)
+        return None if v is None or isinstance(v, (dict, list)) else str(v)
+
+    @field_validator("ssh_enabled", mode="before")
+    @classmethod
+    def _ssh(cls, v):
+        if isinstance(v, str):
+            return v.strip().lower() in ("true", "1", "yes")
+        return bool(v)
+
+    @field_validator("settings", mode="before")
+    @classmethod
+    def _settings(cls, v):
+        return v if isinstance(v, dict) else {}
+
+    @field_validator("clients", mode="before")
+    @classmethod
+    def _clients(cls, v):
+        return v if isinstance(v, list) else []
+
+    @property
+    def clients_truncated(self) -> bool:
+        return len(self.clients) > MAX_INLINE_CLIENTS
+
+    def to_report(self) -> dict:
+        """Normalized row for the ingest writer."""
+        s = self.settings
+
+        def pick(name, default=None):
+            value = getattr(s, name)
+            if value is None:
+                value = getattr(self, name)
+            return default if value is None else value
+
+        fw_profile = pick("firewall_profile")
+        samples = pick("security_log_samples", [])
+        return {
+            "mac": self.mac,
+            "model": pick("model", "unknown"),
+            "wan_ip": pick("wan_ip"),
+            "dns_servers": json.dumps(pick("dns", [])),
+            "ntp_synced": int(pick("ntp", False)),
+            "firewall_state": pick("firewall", "True"),
+            "firewall_profile_active": fw_profile,
+            "security_log_samples": json.dumps(samples),
+            "security_log_lines": samples,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "clients": None if self.clients_chunked else normalize_clients(self.clients[:MAX_INLINE_CLIENTS]),
+            "ssh_enabled": int(self.ssh_enabled),
+        }
+
+
+class ClientChunk(BaseModel):
+    """One piece of a chunked client table upload (POST /clients/chunk).
+
+    Clients come either column-wise ("mac"/"ip"/"hostname" arrays, as the
+    agent sends them) or as a "clients" list of objects.
+    """
+    model_config = ConfigDict(extra="ignore")
+
+    upload: str
+    seq: int = Field(ge=0)
+    last: bool = False
+    mac: List[str] = Field(default_factory=list)
+    ip: List[Optional[str]] = Field(default_factory=list)
+    hostname: List[Optional[str]] = Field(default_factory=list)
+    clients: List[Any] = Field(default_factory=list)
+
+    def to_clients(self) -> list[dict]:
+        rows = list(self.clients)
+        for i, mac in enumerate(self.mac):
+            rows.append({
+                "mac": mac,
+                "ip": self.ip[i] if i < len(self.ip) else None,
+                "hostname": self.hostname[i] if i < len(self.hostname) else None,
+            })
+        return normalize_clients(rows)
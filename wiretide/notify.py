@@ -0,0 +1,53 @@
+# wiretide/notify.py
+import asyncio
+
+
+class ConfigNotifier:
+    """Wake agents parked on /config/wait when their config changes.
+
+    Each parked request is a bare future in a per-MAC set, so thousands of
+    waiters cost one dict entry and one future apiece; `notify(mac)` only
+    touches the waiters for that MAC.
+    """
+
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Future]] = {}
+        self.counters = {"notifications": 0, "woken": 0, "timeouts": 0}
+
+    async def wait(self, mac: str, timeout: float) -> bool:
+        """Park until `notify(mac)` or timeout; True if woken by a change."""
+        fut = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(mac, set())
+        waiters.add(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            return False
+        finally:
+            waiters.discard(fut)
+            if not waiters and self._waiters.get(mac) is waiters:
+                del self._waiters[mac]
+
+    def notify(self, mac: str | None = None):
+        """Wake the waiters for one MAC (or everyone when mac is None)."""
+        self.counters["notifications"] += 1
+        if mac is None:
+            targets = [fut for waiters in self._waiters.values() for fut in waiters]
+        else:
+            targets = list(self._waiters.get(mac.lower(), ()))
+        for fut in targets:
+            if not fut.done():
+                fut.set_result(None)
+                self.counters["woken"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "waiting": sum(len(w) for w in self._waiters.values()),
+            "devices": len(self._waiters),
+        }
+
+
+config_notifier = ConfigNotifier()
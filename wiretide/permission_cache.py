@@ -0,0 +1,62 @@
+# wiretide/permission_cache.py
+import os
+import time
+
+from wiretide.db import pool
+
+TTL_SECONDS = int(os.getenv("WIRETIDE_PERMISSION_TTL", "60"))
+
+
+class PermissionCache:
+    """Per-user RBAC permissions, cached with a TTL and a global version.
+
+    Any change to users, roles or role_permissions calls `bump()`, which makes
+    every cached entry stale at once; the TTL bounds staleness for changes made
+    outside this process.
+    """
+
+    def __init__(self, ttl: int = TTL_SECONDS):
+        self.ttl = ttl
+        self.version = 0
+        # username -> (version, expires_at, permissions or None if user is gone)
+        self._entries: dict[str, tuple[int, float, frozenset | None]] = {}
+        self.counters = {"hits": 0, "misses": 0}
+
+    def bump(self):
+        self.version += 1
+        self._entries.clear()
+
+    async def _load(self, username: str) -> frozenset | None:
+        async with pool.reader() as db:
+            cursor = await db.execute("""
+                SELECT rp.permission FROM users u
+                LEFT JOIN roles r ON u.role_id = r.id
+                LEFT JOIN role_permissions rp ON rp.role_id = r.id
+                WHERE u.username = ?
+            """, (username,))
+            rows = await cursor.fetchall()
+        if not rows:
+            return None
+        return frozenset(row[0] for row in rows if row[0] is not None)
+
+    async def get(self, username: str) -> frozenset | None:
+        """Return the user's permissions, or None if the user no longer exists."""
+        entry = self._entries.get(username)
+        now = time.monotonic()
+        if entry and entry[0] == self.version and entry[1] > now:
+            self.counters["hits"] += 1
+            return entry[2]
+
+        self.counters["misses"] += 1
+        version = self.version
+        perms = await self._load(username)
+        # Only cache if nothing was bumped while we were loading
+        if version == self.version:
+            self._entries[username] = (version, now + self.ttl, perms)
+        return perms
+
+    def stats(self) -> dict:
+        return {**self.counters, "version": self.version, "entries": len(self._entries)}
+
+
+permission_cache = PermissionCache()
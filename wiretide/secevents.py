@@ -0,0 +1,227 @@
+# wiretide/secevents.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+
+import aiosqlite
+
+from wiretide.db import pool
+
+logger = logging.getLogger("wiretide")
+
+# Retention: by age and by total row count, whichever removes more
+RETENTION_DAYS = float(os.getenv("WIRETIDE_SECURITY_EVENTS_DAYS", "30"))
+MAX_EVENTS = int(os.getenv("WIRETIDE_SECURITY_EVENTS_MAX", "5000000"))
+PRUNE_INTERVAL = int(os.getenv("WIRETIDE_SECURITY_EVENTS_PRUNE_INTERVAL", "3600"))
+# Rows deleted per write transaction while pruning (keeps the writer lock short)
+PRUNE_CHUNK = 5000
+
+# line_hash values looked up per query when checking for already stored lines
+EXISTING_CHUNK = 500
+
+INSERT_EVENT = "INSERT OR IGNORE INTO security_events (mac, ts, line_hash, line) VALUES (?, ?, ?, ?)"
+
+
+def line_hash(line: str) -> int:
+    """Signed 64-bit digest of a log line (fits an SQLite INTEGER)."""
+    return int.from_bytes(hashlib.blake2b(line.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, as a literal phrase.
+
+    "SRC=10.0.0.2 tcp" -> '"SRC=10.0.0.2" "tcp"' (quoted, so no FTS syntax errors).
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+class SecurityEventStore:
+    """Append-only store of WTSEC log lines reported by agents, with full-text search.
+
+    Agents resend the tail of their log every report, so most lines arrive
+    several times. Lines already seen in a device's previous report are
+    skipped in memory; the rest are checked against the unique
+    (mac, line_hash) index, so only lines that are really new get inserted
+    and handed on (also after a restart, when the memory is empty).
+    Triggers keep the external-content FTS5 index in sync. ts is the
+    receive time, so ids and ts grow together and time ranges translate to
+    rowid ranges for both the table and the FTS index.
+    """
+
+    def __init__(self, retention_days: float = RETENTION_DAYS, max_events: int = MAX_EVENTS,
+                 prune_interval: int = PRUNE_INTERVAL):
+        self.retention = int(retention_days * 86400)
+        self.max_events = max_events
+        self.prune_interval = prune_interval
+        # mac -> line hashes of its previous report
+        self._recent: dict[str, set[int]] = {}
+        self._task: asyncio.Task | None = None
+        self.counters = {"lines": 0, "skipped": 0, "inserted": 0, "pruned": 0}
+
+    # --- Lifecycle ---
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._prune_loop(), name="wiretide-secevents-prune")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- Write side (called by the ingest writer inside its transaction) ---
+    async def record(self, db: aiosqlite.Connection, reports: list[dict]) -> list[tuple[str, str]]:
+        """Insert the batch's new lines; returns exactly the inserted ones as (mac, line)."""
+        now = int(time.time())
+        # (mac, line_hash) -> line, also collapsing repeats within the batch
+        candidates: dict[tuple[str, int], str] = {}
+        for report in reports:
+            lines = report.get("security_log_lines")
+            if not lines:
+                continue
+            mac = report["mac"]
+            previous = self._recent.get(mac, ())
+            hashes = set()
+            for line in lines:
+                digest = line_hash(line)
+                hashes.add(digest)
+                if digest in previous:
+                    self.counters["skipped"] += 1
+                    continue
+                candidates.setdefault((mac, digest), line)
+            self._recent[mac] = hashes
+            self.counters["lines"] += len(lines)
+
+        if not candidates:
+            return []
+        # _recent is empty after a restart or a rolled-back batch: drop what the table already has
+        existing = await self._existing(db, candidates)
+        for key in existing:
+            del candidates[key]
+        self.counters["skipped"] += len(existing)
+        if not candidates:
+            return []
+        await db.executemany(INSERT_EVENT, [(mac, now, digest, line) for (mac, digest), line in candidates.items()])
+        self.counters["inserted"] += len(candidates)
+        return [(mac, line) for (mac, _), line in candidates.items()]
+
+    @staticmethod
+    async def _existing(db: aiosqlite.Connection, candidates: dict) -> list[tuple[str, int]]:
+        by_mac: dict[str, list[int]] = {}
+        for mac, digest in candidates:
+            by_mac.setdefault(mac, []).append(digest)
+        found = []
+        for mac, digests in by_mac.items():
+            for i in range(0, len(digests), EXISTING_CHUNK):
+                chunk = digests[i:i + EXISTING_CHUNK]
+                cur = await db.execute(
+                    f"SELECT line_hash FROM security_events WHERE mac = ? AND line_hash IN ({','.join('?' * len(chunk))})",
+                    (mac, *chunk),
+                )
+                found.extend((mac, digest) for (digest,) in await cur.fetchall())
+        return found
+
+    def reset(self):
+        """Forget per-device dedupe state (after a rolled-back batch)."""
+        self._recent.clear()
+
+    def forget(self, mac: str):
+        self._recent.pop(mac, None)
+
+    # --- Retention ---
+    async def prune(self) -> int:
+        """Delete events past the age limit, then the oldest beyond MAX_EVENTS."""
+        removed = 0
+        async with pool.reader() as db:
+            expired = await self._edge_id(db, "ts < ? ORDER BY ts DESC, id DESC",
+                                          int(time.time()) - self.retention) or 0
+            cur = await db.execute("SELECT MAX(id) FROM security_events")
+            newest = (await cur.fetchone())[0] or 0
+        # ids are dense apart from deletions, so this is a cheap upper bound for the count cap
+        cutoff = max(expired, newest - self.max_events)
+        while cutoff > 0:
+            async with pool.writer() as db:
+                cur = await db.execute(
+                    "DELETE FROM security_events WHERE id IN "
+                    "(SELECT id FROM security_events WHERE id <= ? ORDER BY id LIMIT ?)",
+                    (cutoff, PRUNE_CHUNK),
+                )
+                await db.commit()
+            removed += cur.rowcount
+            if cur.rowcount < PRUNE_CHUNK:
+                break
+            await asyncio.sleep(0)  # let ingest batches in between chunks
+        self.counters["pruned"] += removed
+        return removed
+
+    async def _prune_loop(self):
+        while True:
+            try:
+                removed = await self.prune()
+                if removed:
+                    logger.info("Security events: pruned %d old events", removed)
+            except Exception as e:
+                logger.warning("Security event prune failed: %s", e)
+            await asyncio.sleep(self.prune_interval)
+
+    # --- Read side ---
+    @staticmethod
+    async def _edge_id(db: aiosqlite.Connection, where: str, ts: int) -> int | None:
+        # One seek on idx_security_events_ts (MIN/MAX(id) with a ts filter would scan the range)
+        cur = await db.execute(f"SELECT id FROM security_events WHERE {where} LIMIT 1", (ts,))
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def _id_range(self, db: aiosqlite.Connection, since: int | None, until: int | None) -> tuple[int, int]:
+        lo, hi = 0, 2 ** 63 - 1
+        if since is not None:
+            first = await self._edge_id(db, "ts >= ? ORDER BY ts, id", since)
+            lo = hi if first is None else first
+        if until is not None:
+            hi = await self._edge_id(db, "ts <= ? ORDER BY ts DESC, id DESC", until) or 0
+        return lo, hi
+
+    async def query(self, mac: str | None = None, text: str | None = None, since: int | None = None,
+                    until: int | None = None, limit: int = 100, before: int | None = None) -> list[dict]:
+        """Newest-first events; `before` is the id to continue below (keyset paging)."""
+        async with pool.reader() as db:
+            lo, hi = await self._id_range(db, since, until)
+            if before is not None:
+                hi = min(hi, before - 1)
+            if lo > hi:
+                return []
+            match = fts_query(text) if text else ""
+            if match:
+                sql = """
+                    SELECT e.id, e.mac, e.ts, e.line
+                    FROM security_events_fts f
+                    JOIN security_events e ON e.id = f.rowid
+                    WHERE security_events_fts MATCH ? AND f.rowid BETWEEN ? AND ?
+                """
+                params = [match, lo, hi]
+                if mac:
+                    sql += " AND e.mac = ?"
+                    params.append(mac)
+                sql += " ORDER BY f.rowid DESC LIMIT ?"
+            else:
+                sql = "SELECT id, mac, ts, line FROM security_events WHERE id BETWEEN ? AND ?"
+                params = [lo, hi]
+                if mac:
+                    sql += " AND mac = ?"
+                    params.append(mac)
+                sql += " ORDER BY id DESC LIMIT ?"
+            params.append(limit)
+            cur = await db.execute(sql, params)
+            rows = await cur.fetchall()
+        return [{"id": id, "mac": mac, "ts": ts, "line": line} for id, mac, ts, line in rows]
+
+    def stats(self) -> dict:
+        return {**self.counters, "devices": len(self._recent)}
+
+
+security_events = SecurityEventStore()
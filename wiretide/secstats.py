@@ -0,0 +1,241 @@
+# wiretide/secstats.py
+import heapq
+import os
+import re
+import time
+from array import array
+from collections import OrderedDict
+
+# Window = BUCKETS buckets of BUCKET_SECONDS each (default: the last hour per minute)
+BUCKET_SECONDS = int(os.getenv("WIRETIDE_SECSTATS_BUCKET_SECONDS", "60"))
+BUCKETS = int(os.getenv("WIRETIDE_SECSTATS_BUCKETS", "60"))
+# Keys kept per dimension; the least recently active key is evicted beyond this
+MAX_DEVICES = int(os.getenv("WIRETIDE_SECSTATS_MAX_DEVICES", "5000"))
+MAX_SOURCES = int(os.getenv("WIRETIDE_SECSTATS_MAX_SOURCES", "20000"))
+MAX_PREFIXES = int(os.getenv("WIRETIDE_SECSTATS_MAX_PREFIXES", "256"))
+# Spike: the last SPIKE_BUCKETS hold at least SPIKE_MIN events and SPIKE_FACTOR
+# times what the rest of the window averages over the same span
+SPIKE_BUCKETS = int(os.getenv("WIRETIDE_SECSTATS_SPIKE_BUCKETS", "5"))
+SPIKE_FACTOR = float(os.getenv("WIRETIDE_SECSTATS_SPIKE_FACTOR", "4"))
+SPIKE_MIN = int(os.getenv("WIRETIDE_SECSTATS_SPIKE_MIN", "20"))
+
+DEVICES, SOURCES, PREFIXES = "devices", "sources", "prefixes"
+
+# "<prefix> IN=br-lan OUT=eth0 ... SRC=10.0.0.2 DST=..." (netfilter LOG target)
+NETFILTER_RE = re.compile(r"(\S+) IN=\S* .*?\bSRC=(\S+)")
+
+
+def parse_line(line: str) -> tuple[str | None, str | None]:
+    """(rule prefix, source IP) of a WTSEC log line; None for parts it does not carry."""
+    m = NETFILTER_RE.search(line)
+    if not m:
+        return None, None
+    return m.group(1), m.group(2)
+
+
+class _Window:
+    __slots__ = ("counts", "epoch", "total")
+
+    def __init__(self, size: int, epoch: int):
+        self.counts = array("I", bytes(4 * size))
+        self.epoch = epoch
+        self.total = 0
+
+
+class SlidingCounters:
+    """Per-key event counts over a sliding window of fixed-width buckets.
+
+    Each key owns a ring buffer; buckets that fell out of the window are only
+    cleared when the key is next touched or read, so adding an event is O(1)
+    amortized and nothing runs on a timer. Keys live in an LRU map capped at
+    max_keys.
+    """
+
+    def __init__(self, buckets: int, max_keys: int):
+        self.size = buckets
+        self.max_keys = max_keys
+        self._keys: OrderedDict = OrderedDict()
+        self.evictions = 0
+
+    def _advance(self, w: _Window, epoch: int):
+        gap = epoch - w.epoch
+        if gap <= 0:
+            return
+        if gap >= self.size:
+            w.counts = array("I", bytes(4 * self.size))
+            w.total = 0
+        else:
+            for e in range(w.epoch + 1, epoch + 1):
+                i = e % self.size
+                w.total -= w.counts[i]
+                w.counts[i] = 0
+        w.epoch = epoch
+
+    def add(self, key, epoch: int, n: int = 1):
+        w = self._keys.get(key)
+        if w is None:
+            if len(self._keys) >= self.max_keys:
+                self._keys.popitem(last=False)
+                self.evictions += 1
+            w = self._keys[key] = _Window(self.size, epoch)
+        else:
+            self._keys.move_to_end(key)
+            self._advance(w, epoch)
+        w.counts[epoch % self.size] += n
+        w.total += n
+
+    def total(self, key, epoch: int) -> int:
+        w = self._keys.get(key)
+        if w is None:
+            return 0
+        self._advance(w, epoch)
+        return w.total
+
+    def series(self, key, epoch: int) -> list[int]:
+        """Counts per bucket, oldest first, ending with the current bucket."""
+        w = self._keys.get(key)
+        if w is None:
+            return [0] * self.size
+        self._advance(w, epoch)
+        return [w.counts[e % self.size] for e in range(epoch - self.size + 1, epoch + 1)]
+
+    def top(self, n: int, epoch: int, where=None) -> list[tuple]:
+        """The n keys with the most events in the window, as (key, count)."""
+        totals = (
+            (key, self.total(key, epoch))
+            for key in list(self._keys)
+            if where is None or where(key)
+        )
+        return [(key, count) for key, count in heapq.nlargest(n, totals, key=lambda kv: kv[1]) if count]
+
+    def keys(self):
+        return list(self._keys)
+
+    def discard(self, key):
+        self._keys.pop(key, None)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class SecurityStats:
+    """Live rates of WTSEC log lines per device, per source IP and per rule prefix.
+
+    Fed with the lines the security event store just accepted (after the
+    ingest batch committed), so lines an agent resends are not counted twice.
+    Counts are by receive time; everything is in memory and restarts empty.
+    """
+
+    def __init__(self, bucket_seconds: int = BUCKET_SECONDS, buckets: int = BUCKETS):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.spike_buckets = max(1, min(SPIKE_BUCKETS, buckets - 1))
+        self.dimensions = {
+            DEVICES: SlidingCounters(buckets, MAX_DEVICES),
+            # keyed (mac, src): talkers behind one router
+            SOURCES: SlidingCounters(buckets, MAX_SOURCES),
+            PREFIXES: SlidingCounters(buckets, MAX_PREFIXES),
+        }
+        self.counters = {"lines": 0, "unparsed": 0}
+
+    def _epoch(self, now: float | None = None) -> int:
+        return int((time.time() if now is None else now) // self.bucket_seconds)
+
+    # --- Write side ---
+    def observe(self, events, now: float | None = None):
+        """Count (mac, line) pairs."""
+        epoch = self._epoch(now)
+        devices, sources, prefixes = (self.dimensions[d] for d in (DEVICES, SOURCES, PREFIXES))
+        for mac, line in events:
+            devices.add(mac, epoch)
+            prefix, src = parse_line(line)
+            if prefix is None:
+                self.counters["unparsed"] += 1
+            else:
+                prefixes.add(prefix, epoch)
+                sources.add((mac, src), epoch)
+            self.counters["lines"] += 1
+
+    def forget(self, mac: str):
+        self.dimensions[DEVICES].discard(mac)
+        sources = self.dimensions[SOURCES]
+        for key in sources.keys():
+            if key[0] == mac:
+                sources.discard(key)
+
+    # --- Read side ---
+    def _spike(self, series: list[int]) -> dict | None:
+        recent = sum(series[-self.spike_buckets:])
+        if recent < SPIKE_MIN:
+            return None
+        history = series[:-self.spike_buckets]
+        if not history:
+            return None
+        baseline = sum(history) / len(history) * self.spike_buckets
+        if recent < SPIKE_FACTOR * baseline:
+            return None
+        return {"recent": recent, "baseline": round(baseline, 1),
+                "ratio": round(recent / baseline, 1) if baseline else None}
+
+    def spikes(self, dimension: str, epoch: int, where=None) -> list[dict]:
+        counters = self.dimensions[dimension]
+        found = []
+        for key in counters.keys():
+            if (where and not where(key)) or counters.total(key, epoch) < SPIKE_MIN:
+                continue
+            spike = self._spike(counters.series(key, epoch))
+            if spike:
+                found.append({**_describe(dimension, key), **spike})
+        found.sort(key=lambda s: s["recent"], reverse=True)
+        return found
+
+    def summary(self, top: int = 10, now: float | None = None) -> dict:
+        """Fleet-wide top-N per dimension plus current spikes."""
+        epoch = self._epoch(now)
+        return {
+            **self._window(),
+            **{
+                name: [{**_describe(name, key), "count": count} for key, count in counters.top(top, epoch)]
+                for name, counters in self.dimensions.items()
+            },
+            "spikes": {name: self.spikes(name, epoch) for name in (DEVICES, SOURCES)},
+        }
+
+    def device(self, mac: str, top: int = 10, now: float | None = None) -> dict:
+        epoch = self._epoch(now)
+        series = self.dimensions[DEVICES].series(mac, epoch)
+
+        def mine(key):
+            return key[0] == mac
+
+        return {
+            **self._window(),
+            "mac": mac,
+            "count": sum(series),
+            "series": series,
+            "spike": self._spike(series),
+            "sources": [
+                {"src": key[1], "count": count}
+                for key, count in self.dimensions[SOURCES].top(top, epoch, where=mine)
+            ],
+            "source_spikes": self.spikes(SOURCES, epoch, where=mine),
+        }
+
+    def _window(self) -> dict:
+        return {"bucket_seconds": self.bucket_seconds, "window_seconds": self.bucket_seconds * self.buckets}
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            **{f"{name}_tracked": len(c) for name, c in self.dimensions.items()},
+            **{f"{name}_evicted": c.evictions for name, c in self.dimensions.items()},
+        }
+
+
+def _describe(dimension: str, key) -> dict:
+    if dimension == SOURCES:
+        return {"mac": key[0], "src": key[1]}
+    return {"mac": key} if dimension == DEVICES else {"prefix": key}
+
+
+security_stats = SecurityStats()
@@ -0,0 +1,95 @@
+# wiretide/token_cache.py
+import hmac
+import os
+import time
+
+from wiretide.db import pool
+
+# Superseded tokens stay valid this long so agents mid-cycle don't get 403s
+GRACE_SECONDS = int(os.getenv("WIRETIDE_TOKEN_GRACE_SECONDS", "120"))
+# A rejected token may trigger a DB re-check at most this often
+RELOAD_INTERVAL = 30
+
+
+class SharedTokenCache:
+    """In-memory copy of the agent shared token (plus recently rotated ones).
+
+    Loaded from the config table once; tokens.py pushes rotations into it so
+    agent authentication normally costs no DB round-trip.
+    """
+
+    def __init__(self, grace_seconds: int = GRACE_SECONDS):
+        self.grace_seconds = grace_seconds
+        self._current: str | None = None
+        self._previous: list[tuple[str, float]] = []  # (token, valid until)
+        self._loaded = False
+        self._last_reload = 0.0
+        self.counters = {"hits": 0, "misses": 0, "grace_hits": 0, "rejected": 0, "loads": 0}
+
+    async def _load(self):
+        async with pool.reader() as db:
+            cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token'")
+            row = await cursor.fetchone()
+        token = (row[0] or "").strip() if row else ""
+        self._set_current(token or None)
+        self._loaded = True
+        self._last_reload = time.monotonic()
+        self.counters["loads"] += 1
+
+    def _set_current(self, token: str | None):
+        if self._current and self._current != token:
+            self._previous.append((self._current, time.monotonic() + self.grace_seconds))
+        self._current = token
+
+    def rotate(self, token: str):
+        """Record a newly stored token; the old one enters its grace period."""
+        self._set_current(token.strip())
+        self._loaded = True
+
+    def invalidate(self):
+        """Force the next lookup to re-read the config table."""
+        self._loaded = False
+
+    async def current(self) -> str | None:
+        if not self._loaded:
+            await self._load()
+        return self._current
+
+    def _match(self, token: bytes) -> str | None:
+        """Compare against every candidate in constant time; return which one matched."""
+        now = time.monotonic()
+        self._previous = [(t, until) for t, until in self._previous if until > now]
+        matched = None
+        if self._current and hmac.compare_digest(token, self._current.encode()):
+            matched = "current"
+        for prev, _ in self._previous:
+            if hmac.compare_digest(token, prev.encode()) and matched is None:
+                matched = "previous"
+        return matched
+
+    async def verify(self, token: str) -> bool:
+        if self._loaded:
+            self.counters["hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            await self._load()
+
+        token_b = token.strip().encode()
+        matched = self._match(token_b)
+        if matched is None and time.monotonic() - self._last_reload > RELOAD_INTERVAL:
+            # Token may have been changed outside this process (install/restore)
+            await self._load()
+            matched = self._match(token_b)
+
+        if matched is None:
+            self.counters["rejected"] += 1
+            return False
+        if matched == "previous":
+            self.counters["grace_hits"] += 1
+        return True
+
+    def stats(self) -> dict:
+        return {**self.counters, "previous_valid": len(self._previous)}
+
+
+token_cache = SharedTokenCache()
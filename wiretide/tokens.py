@@ -1,18 +1,15 @@
 # wiretide/tokens.py
 import secrets
 from datetime import datetime, timedelta
-from wiretide.db import DB_PATH
-import aiosqlite
+from wiretide.db import pool
+from wiretide.token_cache import token_cache
 
 async def get_shared_token() -> str | None:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token'")
-        row = await cursor.fetchone()
-        return row[0] if row else None
+    return await token_cache.current()
 
 async def ensure_valid_shared_token(ttl_minutes: int = 60) -> str:
     now = datetime.utcnow()
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token'")
         token_row = await cursor.fetchone()
         cursor = await db.execute("SELECT value FROM config WHERE key = 'shared_token_expiry'")
@@ -29,14 +26,16 @@ async def ensure_valid_shared_token(ttl_minutes: int = 60) -> str:
         await db.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("shared_token", new_token))
         await db.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("shared_token_expiry", expiry.isoformat()))
         await db.commit()
-        return new_token
+    token_cache.rotate(new_token)
+    return new_token
 
 async def update_token(expiry_delta: timedelta) -> str:
     """Force a new token with a specific lifetime."""
     new_token = secrets.token_urlsafe(32)
     new_expiry = datetime.utcnow() + expiry_delta
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with pool.writer() as db:
         await db.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("shared_token", new_token))
         await db.execute("INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)", ("shared_token_expiry", new_expiry.isoformat()))
         await db.commit()
+    token_cache.rotate(new_token)
     return new_token